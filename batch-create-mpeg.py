@@ -0,0 +1,233 @@
+"""
+Converts a whole directory (or manifest) of MCAP files with create-mpeg2.py, one bag per
+worker process, so the Python/OpenCV startup cost is paid once per worker instead of once
+per file.
+
+A JSON state file records each bag's size, mtime and status. A rerun skips bags that are
+done and unchanged (and whose videos still exist), and converts failed or new ones again.
+
+Usage:
+    python batch-create-mpeg.py /data/bags --topic '/camera/*/compressed' --output-dir videos --jobs 4
+    python batch-create-mpeg.py bags.txt --topic /camera/image_raw --output-dir videos
+"""
+import argparse
+import contextlib
+import glob
+import importlib.util
+import json
+import os
+import pathlib
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from mcap_video import (add_timing_arguments, add_transform_arguments, add_window_arguments, add_writer_arguments,
+                        has_frame_transform, is_passthrough, parse_fps, resolve_time_window, resolve_topic_outputs,
+                        transform_options_from_args, writer_options_from_args)
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parent
+
+def find_bags(sources):
+    """
+    Expands the command line sources into a sorted list of MCAP paths. A source may be an
+    .mcap file, a directory (searched recursively for *.mcap), or a manifest text file with
+    one path per line ('#' starts a comment).
+    """
+    bags = set()
+    for source in sources:
+        if os.path.isdir(source):
+            bags.update(glob.glob(os.path.join(source, "**", "*.mcap"), recursive=True))
+        elif source.endswith(".mcap"):
+            bags.add(source)
+        else:
+            with open(source) as f:
+                for line in f:
+                    line = line.split("#", 1)[0].strip()
+                    if line:
+                        bags.add(line)
+    return sorted(os.path.abspath(bag) for bag in bags)
+
+def load_state(state_file):
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file) as f:
+        return json.load(f)
+
+def save_state(state_file, state):
+    # Write to a temporary file first so an interrupted run never leaves a truncated state file.
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, state_file)
+
+def is_finished(entry, bag):
+    """True if `entry` records a successful conversion of `bag` as it is on disk now."""
+    if not entry or entry.get("status") != "done":
+        return False
+    stat = os.stat(bag)
+    if entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+        return False
+    return all(os.path.exists(output) for output in entry.get("outputs", []))
+
+# --- Worker side ---
+
+_converter = None
+
+def _init_batch_worker():
+    global _converter
+    # create-mpeg2.py has a dash in its name, so it can't be imported normally. Load it once
+    # per worker; every bag this worker converts reuses the loaded module.
+    spec = importlib.util.spec_from_file_location("create_mpeg2", SCRIPT_DIR / "create-mpeg2.py")
+    _converter = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(_converter)
+    # One bag per process; the pool provides the parallelism.
+    cv2.setNumThreads(1)
+
+def _convert_bag(bag, options):
+    """
+    Converts one bag, with its output going to a .log file next to its videos.
+    Returns a dict with status, frames, outputs, seconds and (on failure) error.
+    """
+    stem = os.path.splitext(os.path.basename(bag))[0]
+    log_file = os.path.join(options["output_dir"], f"{stem}.log")
+    result = {"status": "failed", "frames": 0, "outputs": [], "seconds": 0.0, "log": log_file}
+    start = time.perf_counter()
+    with open(log_file, "w") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            output_template = os.path.join(options["output_dir"], f"{stem}_{{topic}}.mp4")
+            topic_outputs = resolve_topic_outputs(bag, options["topic"], output_template)
+            if not topic_outputs:
+                result["error"] = f"no topics match '{options['topic']}'"
+                return result
+            start_time_ns, end_time_ns = resolve_time_window(bag, options["start"], options["end"])
+            counts = _converter.mcap_to_mp4_multi(bag, topic_outputs, options["fps"], options["encoding"],
+                                                  writer_options=options["writer_options"],
+                                                  start_time_ns=start_time_ns, end_time_ns=end_time_ns,
+                                                  limit_frames=options["limit_frames"], timing=options["timing"],
+                                                  transform_options=options["transform_options"], raise_errors=True)
+        except Exception as e:
+            print(f"Error: {e}")
+            result["error"] = str(e)
+            return result
+        finally:
+            result["seconds"] = time.perf_counter() - start
+
+    result["frames"] = sum(counts.values())
+    result["outputs"] = [topic_outputs[topic] for topic, count in counts.items() if count]
+    if result["frames"]:
+        result["status"] = "done"
+    else:
+        result["error"] = "no frames written"
+    return result
+
+# --- Driver ---
+
+def run_batch(bags, options, state_file, jobs):
+    """
+    Converts every bag not already finished according to `state_file`, `jobs` at a time,
+    updating the state file as each bag completes. Bags that don't exist are recorded as
+    failed without stopping the batch. Returns the number of failed and missing bags.
+    """
+    state = load_state(state_file)
+    todo = []
+    missing = []
+    for bag in bags:
+        if not os.path.isfile(bag):
+            # A manifest can name bags that were moved or never copied; record them and go on.
+            missing.append(bag)
+            state[bag] = {"status": "failed", "error": "file not found"}
+        elif not is_finished(state.get(bag), bag):
+            todo.append(bag)
+    done_before = len(bags) - len(todo) - len(missing)
+    print(f"{len(bags)} bags, {done_before} already done, {len(missing)} missing, {len(todo)} to convert with {jobs} jobs.")
+    for bag in missing:
+        print(f"MISSING {bag}")
+    if missing:
+        save_state(state_file, state)
+    if not todo:
+        return len(missing)
+
+    total_frames = 0
+    total_bytes = 0
+    failed = 0
+    wall_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker) as pool:
+        futures = {}
+        for bag in todo:
+            stat = os.stat(bag)
+            state[bag] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "status": "pending"}
+            futures[pool.submit(_convert_bag, bag, options)] = bag
+        save_state(state_file, state)
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            bag = futures[future]
+            entry = state[bag]
+            try:
+                entry.update(future.result())
+            except Exception as e: # the worker process itself died
+                entry.update(status="failed", error=str(e))
+            save_state(state_file, state)
+
+            if entry["status"] == "done":
+                total_frames += entry["frames"]
+                total_bytes += entry["size"]
+                rate = entry["frames"] / entry["seconds"] if entry["seconds"] > 0 else float('inf')
+                print(f"[{done}/{len(todo)}] done   {bag}: {entry['frames']} frames in {entry['seconds']:.1f} s ({rate:.1f} frames/s)")
+            else:
+                failed += 1
+                print(f"[{done}/{len(todo)}] FAILED {bag}: {entry.get('error')} (see {entry.get('log')})")
+
+    wall_s = time.perf_counter() - wall_start
+    print(f"Converted {len(todo) - failed} bags, {failed} failed, {len(missing)} missing, in {wall_s:.1f} s.")
+    if wall_s > 0:
+        print(f"Aggregate: {total_frames} frames, {total_bytes / 1e6:.1f} MB read, "
+              f"{total_frames / wall_s:.1f} frames/s, {total_bytes / 1e6 / wall_s:.1f} MB/s")
+    return failed + len(missing)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert image topics from many MCAP files to MP4 videos with a pool of worker processes.")
+    parser.add_argument("sources", nargs="+",
+                        help="MCAP files, directories (searched recursively for *.mcap), or manifest files listing one bag per line.")
+    parser.add_argument("--topic", required=True,
+                        help="Image topic name, or a glob such as '/camera/*/compressed'. Videos are named <bag>_<topic>.mp4.")
+    parser.add_argument("--output-dir", required=True, help="Directory for the videos, per-bag logs and the state file.")
+    parser.add_argument("--state", default=None,
+                        help="State file used to skip finished bags on a rerun (default: <output-dir>/batch-state.json).")
+    parser.add_argument("--jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Number of bags converted at once (default: half the CPU count).")
+    parser.add_argument("--fps", type=parse_fps, default=30.0,
+                        help="Frames per second for the output videos, or 'auto' to detect it per bag (default: 30.0).")
+    parser.add_argument("--encoding", type=str, default="bgr8",
+                        help="Desired OpenCV encoding for video frames (e.g., bgr8, rgb8, mono8). (default: bgr8)")
+    add_writer_arguments(parser)
+    add_window_arguments(parser)
+    add_timing_arguments(parser)
+    add_transform_arguments(parser)
+
+    args = parser.parse_args()
+    writer_options = writer_options_from_args(args)
+    transform_options = transform_options_from_args(args)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.every_nth < 1:
+        parser.error("--every-nth must be at least 1")
+    if is_passthrough(writer_options) and has_frame_transform(transform_options):
+        parser.error("--scale and --crop need decoded frames, so they can't be used with --backend ffmpeg-passthrough")
+    try:
+        bags = find_bags(args.sources)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    stems = Counter(os.path.splitext(os.path.basename(bag))[0] for bag in bags)
+    duplicates = sorted(stem for stem, count in stems.items() if count > 1)
+    if duplicates:
+        parser.error(f"Several bags share a file name, so their videos would collide: {', '.join(duplicates)}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    options = {"output_dir": args.output_dir, "topic": args.topic, "fps": args.fps, "encoding": args.encoding,
+               "writer_options": writer_options, "start": args.start, "end": args.end,
+               "limit_frames": args.limit_frames, "timing": args.timing, "transform_options": transform_options}
+    failed = run_batch(bags, options, args.state or os.path.join(args.output_dir, "batch-state.json"), args.jobs)
+    raise SystemExit(1 if failed else 0)
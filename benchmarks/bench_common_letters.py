@@ -0,0 +1,68 @@
+"""
+Benchmark: getCommonLetters in listComprehension.py against the original version (which
+rebuilt set(string2.lower()) for every letter of string1) and a plain set intersection,
+on two random texts of 10^3 to 10^8 characters. The "worst case" inputs hide one common
+letter at the very end of the second text, so early exit can't help; "typical" inputs are
+random text where every letter turns up quickly. getCommonLettersInFiles is timed on the
+same texts written to files.
+
+Usage: python benchmarks/bench_common_letters.py [--max-exponent 7] [--original-max-exponent 6]
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+from bench_image_msg import load_script, time_per_call
+
+def original_get_common_letters(string1, string2):
+    return {x for x in set(string1.lower()) if x in set(string2.lower())}
+
+def sets_once(string1, string2):
+    return set(string1.lower()) & set(string2.lower())
+
+def random_text(length, alphabet, rng):
+    return "".join(np.array(list(alphabet))[rng.integers(0, len(alphabet), length)])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark common letters of large strings and files.")
+    parser.add_argument("--max-exponent", type=int, default=7, help="Largest input is 10^N characters (default: 7).")
+    parser.add_argument("--original-max-exponent", type=int, default=6,
+                        help="Largest input the (slow) original version is timed on (default: 6).")
+    parser.add_argument("--non-ascii", action="store_true", help="Add non-ASCII letters to the texts (set path).")
+    args = parser.parse_args()
+
+    letters = load_script("listComprehension.py", "list_comprehension")
+    rng = np.random.default_rng(0)
+    alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPRSTUVWXYZ .,\n" + ("åäöÅÄÖ" if args.non_ascii else "")
+
+    print(f"{'case':<9} {'chars':>10} {'original ms':>12} {'sets ms':>10} {'new ms':>10} {'files ms':>10} {'vs sets':>8}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for exponent in range(3, args.max_exponent + 1):
+            length = 10**exponent
+            text1 = random_text(length, alphabet, rng) + "q"
+            for case in ["typical", "worst"]:
+                # The alphabet has no "q": text2 has it first in the typical case, last in the worst.
+                text2 = random_text(length, alphabet, rng)
+                text2 = text2 + "q" if case == "worst" else "q" + text2
+                paths = [os.path.join(work_dir, "1.txt"), os.path.join(work_dir, "2.txt")]
+                for path, text in zip(paths, [text1, text2]):
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(text)
+
+                expected = sets_once(text1, text2)
+                assert letters.getCommonLetters(text1, text2) == expected
+                assert letters.getCommonLettersInFiles(paths) == expected
+                repeat = max(1, 10**5 // length)
+                original = "-"
+                if exponent <= args.original_max_exponent:
+                    original = f"{time_per_call(lambda: original_get_common_letters(text1, text2), repeat) * 1e3:12.2f}"
+                sets = time_per_call(lambda: sets_once(text1, text2), repeat)
+                new = time_per_call(lambda: letters.getCommonLetters(text1, text2), repeat)
+                files = time_per_call(lambda: letters.getCommonLettersInFiles(paths), repeat)
+                print(f"{case:<9} {length:>10} {original:>12} {sets * 1e3:10.2f} {new * 1e3:10.2f} "
+                      f"{files * 1e3:10.2f} {sets / new:7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Benchmark suite for the MCAP converters on synthetic fixtures (see mcap_fixtures.py), so
+performance can be measured without a real robot bag.
+
+End to end, create-mpeg2.py and create-mpeg.py (when cv_bridge is importable) are run on
+every fixture as subprocesses with --metrics-json, recording frames/s, per-frame latency of
+the decode and write stages, and peak RSS. Per frame, image_msg_to_cv2_manual,
+image_msg_to_cv2_fast and compressed_imgmsg_to_cv2_manual are timed in process, with the
+peak memory they allocate (tracemalloc).
+
+Results are saved as JSON. Passing an earlier results file as --baseline reports every case
+that got slower by more than --tolerance, and exits with status 1 if there are any.
+
+Usage:
+    python benchmarks/bench_converters.py --quick
+    python benchmarks/bench_converters.py --save benchmarks/results/baseline.json
+    python benchmarks/bench_converters.py --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from bench_image_msg import REPO_ROOT, load_script, time_per_call
+from mcap_fixtures import COMPRESSED_KINDS, KINDS, ROW_PADDING, TOPIC, ensure_fixture, raw_image_fields, synthetic_frame
+
+SCRIPTS = ["create-mpeg2.py", "create-mpeg.py"]
+
+def parse_resolution(value):
+    width, _, height = value.partition("x")
+    return int(width), int(height)
+
+def script_available(script):
+    """create-mpeg.py needs cv_bridge and sensor_msgs from a ROS 2 environment."""
+    if script == "create-mpeg.py":
+        return all(importlib.util.find_spec(module) is not None for module in ["cv_bridge", "sensor_msgs"])
+    return True
+
+def run_converter(script, fixture, work_dir):
+    """Runs one converter on one fixture and returns its result dict."""
+    output_file = os.path.join(work_dir, "out.mp4")
+    metrics_file = os.path.join(work_dir, "metrics.json")
+    if os.path.exists(metrics_file):
+        os.remove(metrics_file)
+    command = [sys.executable, str(REPO_ROOT / script), fixture, TOPIC, output_file, "--metrics-json", metrics_file]
+    start = time.perf_counter()
+    process = subprocess.run(command, capture_output=True, text=True, cwd=REPO_ROOT)
+    process_s = time.perf_counter() - start
+    if process.returncode != 0 or not os.path.exists(metrics_file):
+        lines = (process.stderr or process.stdout).strip().splitlines()
+        return {"error": lines[-1] if lines else f"exit status {process.returncode}"}
+
+    with open(metrics_file) as f:
+        metrics = json.load(f)
+    if not metrics["frames"]:
+        return {"error": f"no frames written, skipped: {metrics['skipped']}"}
+    stages = metrics["stages"]
+    result = {
+        "frames": metrics["frames"],
+        "frames_per_s": metrics["frames_per_s"],
+        "ms_per_frame": round(1e3 / metrics["frames_per_s"], 4),
+        "peak_rss_mb": metrics["peak_rss_mb"],
+        "process_s": round(process_s, 3), # including interpreter and import startup
+    }
+    for stage in ["decode", "write"]:
+        if stage in stages:
+            result[f"{stage}_p50_ms"] = stages[stage]["p50_ms"]
+            result[f"{stage}_p95_ms"] = stages[stage]["p95_ms"]
+    return result
+
+def time_helper(fn, repeat):
+    """Returns ms per call and the peak memory allocated by a single call, in MB."""
+    seconds = time_per_call(fn, repeat)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"ms_per_call": round(seconds * 1e3, 4), "peak_alloc_mb": round(peak / 1e6, 2)}
+
+def bench_helpers(converter, kind, width, height, repeat):
+    """Times the per-frame conversion helpers on one synthetic frame of `kind`."""
+    frame = synthetic_frame(0, width, height, np.random.default_rng(0))
+    results = {}
+    if kind in COMPRESSED_KINDS:
+        ok, payload = cv2.imencode(".jpg" if kind == "jpeg" else ".png", frame)
+        info = {"type": "CompressedImage", "format": kind, "data": payload.tobytes()}
+        results["compressed_imgmsg_to_cv2_manual"] = time_helper(lambda: converter.compressed_imgmsg_to_cv2_manual(info), repeat)
+        return results
+
+    encoding, _, padded = kind.partition("-")
+    info = dict(raw_image_fields(frame, encoding, ROW_PADDING if padded else 0), type="Image")
+    if converter.image_msg_to_cv2_manual(info) is None:
+        results["image_msg_to_cv2_manual"] = {"error": "unsupported"}
+    else:
+        results["image_msg_to_cv2_manual"] = time_helper(lambda: converter.image_msg_to_cv2_manual(info), repeat)
+    out = converter.image_msg_to_cv2_fast(info)
+    if out is None:
+        results["image_msg_to_cv2_fast"] = {"error": "unsupported"}
+    else:
+        results["image_msg_to_cv2_fast"] = time_helper(lambda: converter.image_msg_to_cv2_fast(info, out=out), repeat)
+    return results
+
+def run_suite(kinds, resolutions, lengths, fixture_dir, repeat):
+    converter = load_script("create-mpeg2.py", "create_mpeg2")
+    scripts = [script for script in SCRIPTS if script_available(script)]
+    for script in SCRIPTS:
+        if script not in scripts:
+            print(f"Skipping {script}: cv_bridge/sensor_msgs are not importable (source a ROS 2 environment).")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for kind in kinds:
+            for width, height in resolutions:
+                for name, result in bench_helpers(converter, kind, width, height, repeat).items():
+                    key = f"{name}:{kind}:{width}x{height}"
+                    results[key] = result
+                    print_result(key, result)
+                for frames in lengths:
+                    fixture = ensure_fixture(fixture_dir, kind, width, height, frames)
+                    for script in scripts:
+                        key = f"{script}:{kind}:{width}x{height}x{frames}"
+                        results[key] = run_converter(script, fixture, work_dir)
+                        print_result(key, results[key])
+    return results
+
+def print_result(key, result):
+    if "error" in result:
+        print(f"{key:<52} ERROR: {result['error']}")
+    elif "frames_per_s" in result:
+        print(f"{key:<52} {result['frames_per_s']:9.1f} frames/s  {result['ms_per_frame']:8.3f} ms/frame  "
+              f"decode p95 {result.get('decode_p95_ms', 0):7.3f} ms  peak RSS {result['peak_rss_mb']:7.1f} MB")
+    else:
+        print(f"{key:<52} {result['ms_per_call']:9.3f} ms/call   peak alloc {result['peak_alloc_mb']:7.2f} MB")
+
+def compare(results, baseline, tolerance):
+    """Returns a list of (key, old, new, change) for cases that got slower than `tolerance`."""
+    regressions = []
+    for key, result in results.items():
+        old = baseline.get(key)
+        if not old or "error" in old or "error" in result:
+            continue
+        if "frames_per_s" in result:
+            change = result["frames_per_s"] / old["frames_per_s"] - 1 # negative is slower
+            if change < -tolerance:
+                regressions.append((key, f"{old['frames_per_s']:.1f} frames/s", f"{result['frames_per_s']:.1f} frames/s", change))
+        else:
+            change = old["ms_per_call"] / result["ms_per_call"] - 1
+            if change < -tolerance:
+                regressions.append((key, f"{old['ms_per_call']:.3f} ms", f"{result['ms_per_call']:.3f} ms", change))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MCAP converters on synthetic fixtures.")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=KINDS, help="Fixture kinds (default: all).")
+    parser.add_argument("--resolutions", nargs="+", type=parse_resolution, default=[(640, 480), (1920, 1080)],
+                        metavar="WxH", help="Frame sizes (default: 640x480 1920x1080).")
+    parser.add_argument("--frames", nargs="+", type=int, default=[30, 120], help="Fixture lengths (default: 30 120).")
+    parser.add_argument("--repeat", type=int, default=20, help="Calls per helper timing (default: 20).")
+    parser.add_argument("--quick", action="store_true", help="Only 320x240 and 30 frames, for a fast smoke run.")
+    parser.add_argument("--fixture-dir", default=str(REPO_ROOT / "benchmarks" / "fixtures"),
+                        help="Where generated fixtures are cached (default: benchmarks/fixtures).")
+    parser.add_argument("--save", default=str(REPO_ROOT / "benchmarks" / "results" / "latest.json"),
+                        help="Results file to write (default: benchmarks/results/latest.json).")
+    parser.add_argument("--baseline", default=None, help="Earlier results file to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Slowdown (as a fraction) reported as a regression (default: 0.15).")
+    args = parser.parse_args()
+    if args.quick:
+        args.resolutions, args.frames = [(320, 240)], [30]
+
+    results = run_suite(args.kinds, args.resolutions, args.frames, args.fixture_dir, args.repeat)
+
+    report = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"), "platform": platform.platform(),
+            "python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__,
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+    with open(args.save, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Results saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if not regressions:
+            print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}.")
+            return
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%} against {args.baseline}:")
+        for key, old, new, change in regressions:
+            print(f"  {key:<52} {old} -> {new} ({change:+.0%})")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
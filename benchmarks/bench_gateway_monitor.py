@@ -0,0 +1,127 @@
+"""
+Benchmark: cost per 10k gateways of the client side of srcful/gateway-monitor.py, i.e.
+decoding the batched GraphQL responses and turning the timestamps into statuses, compared
+with the per-gateway json.loads + datetime.strptime of the original script.
+
+With --endpoint, fetchLatest is also timed end to end against a running API, normally the
+local stand-in (srcful/fake-srcful-api.py), so the network side can be compared too.
+
+Usage:
+    python benchmarks/bench_gateway_monitor.py [--gateways 10000] [--batch-size 50] [--repeat 20]
+    python srcful/fake-srcful-api.py --port 8080 &
+    python benchmarks/bench_gateway_monitor.py --endpoint http://127.0.0.1:8080
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+
+from bench_image_msg import load_script, time_per_call
+
+PER = 10_000 # results are reported per this many gateways
+
+def make_bodies(gwIds, batch_size, rng):
+    """Raw response bodies as the API returns them for batches of aliased lookups (~5% without data)."""
+    now = datetime.now(timezone.utc)
+    bodies = []
+    for start in range(0, len(gwIds), batch_size):
+        derData = {}
+        for i in range(len(gwIds[start:start + batch_size])):
+            if rng.random() < 0.05:
+                derData[f"g{i}"] = None
+                continue
+            ts = now - timedelta(seconds=float(rng.exponential(120)))
+            derData[f"g{i}"] = {"latest": {"ts": ts.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"}}
+        bodies.append(json.dumps({"data": {"derData": derData}}).encode())
+    return bodies
+
+def extract_latest(gwIds, batch_size, decoded):
+    results = {}
+    for batch, body in enumerate(decoded):
+        derData = body["data"]["derData"]
+        for i, gwId in enumerate(gwIds[batch * batch_size:(batch + 1) * batch_size]):
+            solar = derData[f"g{i}"]
+            results[gwId] = solar["latest"]["ts"] if solar else None
+    return results
+
+def statuses_strptime(gwIds, results, offline_after):
+    """The original script's evaluation, one gateway at a time."""
+    current = datetime.now(timezone.utc)
+    statuses = []
+    for gwId in gwIds:
+        ts = results[gwId]
+        if ts is None:
+            statuses.append("No data")
+            continue
+        latest = datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+        statuses.append("Offline" if current - latest > offline_after else "Online")
+    return statuses
+
+def statuses_fromisoformat(monitor, gwIds, results, offline_after):
+    current = datetime.now(timezone.utc)
+    return ["No data" if results[gwId] is None else
+            "Offline" if current - monitor.parseTimestamp(results[gwId]) > offline_after else "Online"
+            for gwId in gwIds]
+
+def report(name, seconds, count, baseline=None):
+    per = seconds * PER / count
+    speedup = f"{baseline / seconds:6.1f}x" if baseline else ""
+    print(f"{name:<44} {per * 1e3:10.2f} ms/{PER // 1000}k {speedup}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response decoding and status evaluation of gateway-monitor.py.")
+    parser.add_argument("--gateways", type=int, default=PER, help=f"Gateways per run (default: {PER}).")
+    parser.add_argument("--batch-size", type=int, default=50, help="Gateways per response body (default: 50).")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--endpoint", default=None, help="Also time fetchLatest end to end against this API.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    monitor = load_script("srcful/gateway-monitor.py", "gateway_monitor")
+    rng = np.random.default_rng(0)
+    gwIds = [f"{i:018x}" for i in range(args.gateways)]
+    bodies = make_bodies(gwIds, args.batch_size, rng)
+    offline_after = timedelta(minutes=5)
+    print(f"{args.gateways} gateways in {len(bodies)} responses of {args.batch_size}, "
+          f"{sum(map(len, bodies)) / 1e6:.1f} MB, {args.repeat} runs each")
+
+    print("decode")
+    baseline = time_per_call(lambda: [json.loads(body.decode("utf-8")) for body in bodies], args.repeat)
+    report("json.loads(content.decode('utf-8'))", baseline, args.gateways)
+    report("json.loads(content)", time_per_call(lambda: [json.loads(body) for body in bodies], args.repeat),
+           args.gateways, baseline)
+    if monitor.orjson:
+        report("orjson.loads(content)", time_per_call(lambda: [monitor.orjson.loads(body) for body in bodies], args.repeat),
+               args.gateways, baseline)
+    else:
+        print(f"{'orjson.loads(content)':<44} not installed")
+
+    print("status evaluation")
+    results = extract_latest(gwIds, args.batch_size, [json.loads(body) for body in bodies])
+    expected = statuses_strptime(gwIds, results, offline_after)
+    assert monitor.evaluateStatuses(gwIds, results, datetime.now(timezone.utc), offline_after)[0].tolist() == expected
+    baseline = time_per_call(lambda: statuses_strptime(gwIds, results, offline_after), args.repeat)
+    report("datetime.strptime per gateway", baseline, args.gateways)
+    report("parseTimestamp (fromisoformat) per gateway",
+           time_per_call(lambda: statuses_fromisoformat(monitor, gwIds, results, offline_after), args.repeat),
+           args.gateways, baseline)
+    report("evaluateStatuses (datetime64 arrays)",
+           time_per_call(lambda: monitor.evaluateStatuses(gwIds, results, datetime.now(timezone.utc), offline_after),
+                         args.repeat),
+           args.gateways, baseline)
+
+    if args.endpoint:
+        print(f"fetchLatest against {args.endpoint}")
+        start = time.perf_counter()
+        fetched = asyncio.run(monitor.fetchLatest(gwIds, args.endpoint, args.concurrency, args.batch_size))
+        elapsed = time.perf_counter() - start
+        failed = sum(isinstance(value, Exception) for value in fetched.values())
+        report(f"batch size {args.batch_size}, concurrency {args.concurrency}", elapsed, args.gateways)
+        if failed:
+            print(f"  ({failed} failed lookups)")
+
+if __name__ == "__main__":
+    main()
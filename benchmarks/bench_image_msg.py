@@ -0,0 +1,78 @@
+"""
+Microbenchmark: image_msg_to_cv2_fast vs image_msg_to_cv2_manual (create-mpeg2.py)
+on synthetic raw Image messages, padded and unpadded.
+
+Usage: python benchmarks/bench_image_msg.py [--width 1920] [--height 1080] [--repeat 50]
+"""
+import argparse
+import importlib.util
+import pathlib
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT)) # the converters import mcap_video from the repo root
+
+def load_script(file_name, module_name):
+    # The converters are scripts with dashes in their names, so they can't be imported normally.
+    spec = importlib.util.spec_from_file_location(module_name, REPO_ROOT / file_name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def make_image_info(encoding, width, height, padding, rng):
+    channels, dtype = {
+        "mono8": (1, np.uint8), "mono16": (1, np.uint16),
+        "rgb8": (3, np.uint8), "bgra8": (4, np.uint8),
+    }[encoding]
+    row_bytes = width * channels * np.dtype(dtype).itemsize
+    step = row_bytes + padding
+    data = rng.integers(0, 256, size=step * height, dtype=np.uint8).tobytes()
+    return {
+        "type": "Image", "height": height, "width": width, "encoding": encoding,
+        "is_bigendian": 0, "step": step, "data": data,
+    }
+
+def time_per_call(fn, repeat):
+    fn() # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark raw Image -> OpenCV frame conversion.")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--encoding", type=str, default="bgr8", help="Desired output encoding (default: bgr8).")
+    args = parser.parse_args()
+
+    converter = load_script("create-mpeg2.py", "create_mpeg2")
+    rng = np.random.default_rng(0)
+
+    print(f"{args.width}x{args.height} -> {args.encoding}, {args.repeat} calls each")
+    print(f"{'input':<16} {'manual ms':>10} {'fast ms':>10} {'speedup':>8}  result")
+    for encoding in ["mono8", "mono16", "rgb8", "bgra8"]:
+        for padding in [0, 64]:
+            info = make_image_info(encoding, args.width, args.height, padding, rng)
+            label = f"{encoding}{' padded' if padding else ''}"
+
+            out = converter.image_msg_to_cv2_fast(info, args.encoding)
+            fast_s = time_per_call(lambda: converter.image_msg_to_cv2_fast(info, args.encoding, out=out), args.repeat)
+
+            expected = converter.image_msg_to_cv2_manual(info, args.encoding)
+            if expected is None:
+                print(f"{label:<16} {'n/a':>10} {fast_s * 1e3:10.2f} {'':>8}  manual conversion unsupported")
+                continue
+            manual_s = time_per_call(lambda: converter.image_msg_to_cv2_manual(info, args.encoding), args.repeat)
+            if expected.shape != out.shape:
+                result = f"manual returns shape {expected.shape}"
+            else:
+                result = "match" if np.array_equal(expected, out) else "MISMATCH"
+            print(f"{label:<16} {manual_s * 1e3:10.2f} {fast_s * 1e3:10.2f} {manual_s / fast_s:7.1f}x  {result}")
+
+if __name__ == "__main__":
+    main()
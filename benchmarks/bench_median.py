@@ -0,0 +1,81 @@
+"""
+Benchmark: the median helpers in medianTwoSortedArrays.py against the original
+findMedianSortedArrays (concatenate and sort), on sorted Python lists of 10^3 to 10^7
+elements in total, plus the NumPy batch API against a loop, the k-way version against
+merging with sorted(), and slidingMedians against re-sorting every window.
+
+Usage: python benchmarks/bench_median.py [--max-exponent 7] [--batch 10000] [--ways 8] [--window 1000]
+"""
+import argparse
+
+import numpy as np
+
+from bench_image_msg import load_script, time_per_call
+
+def sorted_lists(total, ways, rng):
+    """`ways` sorted lists of random ints with `total` elements between them."""
+    sizes = np.diff(np.sort(np.concatenate([[0, total], rng.integers(0, total + 1, ways - 1)])))
+    return [np.sort(rng.integers(0, 10**9, size)).tolist() for size in sizes]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark medians of sorted arrays.")
+    parser.add_argument("--max-exponent", type=int, default=7, help="Largest input is 10^N elements (default: 7).")
+    parser.add_argument("--batch", type=int, default=10_000, help="Pairs in the batch benchmark (default: 10000).")
+    parser.add_argument("--ways", type=int, default=8, help="Arrays in the k-way benchmark (default: 8).")
+    parser.add_argument("--window", type=int, default=1000, help="Window of the sliding median benchmark (default: 1000).")
+    args = parser.parse_args()
+
+    median = load_script("medianTwoSortedArrays.py", "median_two_sorted_arrays")
+    rng = np.random.default_rng(0)
+
+    print("two sorted lists")
+    print(f"{'elements':>10} {'sort ms':>10} {'partition us':>13} {'speedup':>9}")
+    for exponent in range(3, args.max_exponent + 1):
+        nums1, nums2 = sorted_lists(10**exponent, 2, rng)
+        expected = median.findMedianSortedArrays(nums1, nums2)
+        assert median.findMedianSortedArraysFast(nums1, nums2) == expected
+        slow = time_per_call(lambda: median.findMedianSortedArrays(nums1, nums2), max(1, 10**6 // 10**exponent))
+        fast = time_per_call(lambda: median.findMedianSortedArraysFast(nums1, nums2), 10_000)
+        print(f"{10**exponent:>10} {slow * 1e3:10.3f} {fast * 1e6:13.2f} {slow / fast:8.1f}x")
+
+    print(f"batch of {args.batch} pairs (100 + 100 elements, ragged lengths)")
+    nums1 = np.sort(rng.integers(0, 1000, (args.batch, 100)), axis=1).astype(np.float64)
+    nums2 = np.sort(rng.integers(0, 1000, (args.batch, 100)), axis=1).astype(np.float64)
+    lengths1 = rng.integers(0, 101, args.batch)
+    lengths2 = rng.integers(1, 101, args.batch)
+    rows = [(row1[:length1].tolist(), row2[:length2].tolist())
+            for row1, row2, length1, length2 in zip(nums1, nums2, lengths1, lengths2)]
+    expected = [median.findMedianSortedArrays(row1, row2) for row1, row2 in rows]
+    assert np.allclose(median.findMediansBatch(nums1, nums2, lengths1, lengths2), expected)
+    loop = time_per_call(lambda: [median.findMedianSortedArraysFast(row1, row2) for row1, row2 in rows], 5)
+    batch = time_per_call(lambda: median.findMediansBatch(nums1, nums2, lengths1, lengths2), 5)
+    print(f"{'loop of findMedianSortedArraysFast':<36} {loop * 1e3:9.2f} ms")
+    print(f"{'findMediansBatch':<36} {batch * 1e3:9.2f} ms {loop / batch:6.1f}x")
+
+    print(f"{args.ways} sorted lists")
+    print(f"{'elements':>10} {'sorted() ms':>12} {'k-way us':>10} {'speedup':>9}")
+    for exponent in range(3, args.max_exponent + 1):
+        arrays = sorted_lists(10**exponent, args.ways, rng)
+        def merged_median():
+            merged = sorted(value for array in arrays for value in array)
+            middle = len(merged) // 2
+            return merged[middle] if len(merged) % 2 else (merged[middle - 1] + merged[middle]) / 2
+        assert median.findMedianSortedArraysKWay(arrays) == merged_median()
+        slow = time_per_call(merged_median, max(1, 10**6 // 10**exponent))
+        fast = time_per_call(lambda: median.findMedianSortedArraysKWay(arrays), 1000)
+        print(f"{10**exponent:>10} {slow * 1e3:12.3f} {fast * 1e6:10.2f} {slow / fast:8.1f}x")
+
+    stream = rng.integers(0, 10**6, 20 * args.window).tolist()
+    print(f"sliding median, window {args.window}, {len(stream)} values")
+    def resorted():
+        return [median.findMedianSortedArrays(stream[i:i + args.window], [])
+                for i in range(len(stream) - args.window + 1)]
+    assert list(median.slidingMedians(stream, args.window)) == resorted()
+    slow = time_per_call(resorted, 1)
+    fast = time_per_call(lambda: list(median.slidingMedians(stream, args.window)), 3)
+    per_value = len(stream) - args.window + 1
+    print(f"{'re-sort every window':<36} {slow / per_value * 1e6:9.2f} us/value")
+    print(f"{'slidingMedians':<36} {fast / per_value * 1e6:9.2f} us/value {slow / fast:6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Synthetic MCAP fixtures for the converter benchmarks: one image topic per file, with raw
+Images (mono8, mono16, rgb8, bgra8; optionally with row padding) or CompressedImages
+(jpeg, png) at a given resolution and length. Frames are deterministic (seeded noise on a
+moving gradient), so the same parameters always produce the same file.
+
+Usage: python benchmarks/mcap_fixtures.py out.mcap --kind rgb8-padded --width 1280 --height 720 --frames 60
+"""
+import argparse
+import os
+
+import cv2
+import numpy as np
+from mcap_ros2.writer import Writer
+
+TOPIC = "/bench/image"
+START_TIME_NS = 1_700_000_000_000_000_000
+FRAME_INTERVAL_NS = 33_333_333 # 30 FPS
+ROW_PADDING = 64 # bytes appended to each row of the "-padded" kinds
+
+RAW_KINDS = ["mono8", "mono16", "rgb8", "bgra8"]
+COMPRESSED_KINDS = ["jpeg", "png"]
+KINDS = [f"{encoding}{suffix}" for encoding in RAW_KINDS for suffix in ["", "-padded"]] + COMPRESSED_KINDS
+
+_TIME_MSGDEF = "int32 sec\nuint32 nanosec\n"
+_HEADER_MSGDEF = "builtin_interfaces/Time stamp\nstring frame_id\n"
+_DEPENDENCIES = ("=" * 80 + "\nMSG: std_msgs/Header\n" + _HEADER_MSGDEF
+                 + "=" * 80 + "\nMSG: builtin_interfaces/Time\n" + _TIME_MSGDEF)
+IMAGE_MSGDEF = ("std_msgs/Header header\nuint32 height\nuint32 width\nstring encoding\nuint8 is_bigendian\n"
+                "uint32 step\nuint8[] data\n" + _DEPENDENCIES)
+COMPRESSED_IMAGE_MSGDEF = "std_msgs/Header header\nstring format\nuint8[] data\n" + _DEPENDENCIES
+
+# encoding -> (channels, dtype)
+RAW_LAYOUTS = {"mono8": (1, np.uint8), "mono16": (1, np.uint16), "rgb8": (3, np.uint8), "bgra8": (4, np.uint8)}
+
+def fixture_name(kind, width, height, frames):
+    return f"{kind}_{width}x{height}_{frames}f.mcap"
+
+def synthetic_frame(index, width, height, rng):
+    """A BGR uint8 frame: a gradient that moves with `index`, plus a little noise."""
+    x = np.arange(width, dtype=np.uint16)
+    y = np.arange(height, dtype=np.uint16)[:, None]
+    base = ((x + y + index * 8) % 256).astype(np.uint8)
+    frame = np.dstack([base, np.roll(base, width // 3, axis=1), np.roll(base, height // 3, axis=0)])
+    noise = rng.integers(0, 16, size=frame.shape, dtype=np.uint8)
+    return cv2.add(frame, noise)
+
+def raw_image_fields(frame, encoding, padding):
+    """The Image message fields (height, width, encoding, step, data) for a BGR frame."""
+    channels, dtype = RAW_LAYOUTS[encoding]
+    if encoding == "mono8":
+        pixels = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    elif encoding == "mono16":
+        pixels = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).astype(np.uint16) * 257
+    elif encoding == "rgb8":
+        pixels = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    else:
+        pixels = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+    height, width = frame.shape[:2]
+    row_bytes = width * channels * np.dtype(dtype).itemsize
+    rows = np.zeros((height, row_bytes + padding), dtype=np.uint8)
+    rows[:, :row_bytes] = pixels.reshape(height, -1).view(np.uint8)
+    return {"height": height, "width": width, "encoding": encoding, "is_bigendian": 0,
+            "step": row_bytes + padding, "data": rows.tobytes()}
+
+def write_fixture(path, kind, width, height, frames, seed=0):
+    """Writes a fixture MCAP with `frames` messages of the given kind (see KINDS) on TOPIC."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown fixture kind '{kind}', expected one of {', '.join(KINDS)}")
+    rng = np.random.default_rng(seed)
+    encoding, _, padded = kind.partition("-")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        writer = Writer(f)
+        if kind in COMPRESSED_KINDS:
+            schema = writer.register_msgdef("sensor_msgs/msg/CompressedImage", COMPRESSED_IMAGE_MSGDEF)
+        else:
+            schema = writer.register_msgdef("sensor_msgs/msg/Image", IMAGE_MSGDEF)
+        for index in range(frames):
+            log_time = START_TIME_NS + index * FRAME_INTERVAL_NS
+            header = {"stamp": {"sec": log_time // 10**9, "nanosec": log_time % 10**9}, "frame_id": "bench"}
+            frame = synthetic_frame(index, width, height, rng)
+            if kind in COMPRESSED_KINDS:
+                ok, payload = cv2.imencode(".jpg" if kind == "jpeg" else ".png", frame)
+                message = {"header": header, "format": kind, "data": payload.tobytes()}
+            else:
+                message = dict(raw_image_fields(frame, encoding, ROW_PADDING if padded else 0), header=header)
+            writer.write_message(TOPIC, schema, message, log_time=log_time, publish_time=log_time)
+        writer.finish()
+    os.replace(tmp_path, path)
+
+def ensure_fixture(directory, kind, width, height, frames):
+    """Returns the path of the fixture in `directory`, generating it first if it isn't there yet."""
+    path = os.path.join(directory, fixture_name(kind, width, height, frames))
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        write_fixture(path, kind, width, height, frames)
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic MCAP file with one image topic.")
+    parser.add_argument("output_file")
+    parser.add_argument("--kind", choices=KINDS, default="rgb8")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--frames", type=int, default=60)
+    args = parser.parse_args()
+    write_fixture(args.output_file, args.kind, args.width, args.height, args.frames)
+    print(f"Wrote {args.frames} {args.kind} frames ({args.width}x{args.height}) on {TOPIC} to {args.output_file}")
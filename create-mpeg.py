@@ -1,8 +1,15 @@
 import argparse
+import time
+
 import cv2
 import numpy as np
 from cv_bridge import CvBridge
-from mcap_ros2.reader import read_ros2_messages
+
+from mcap_video import (ConversionMetrics, FrameWriterThread, add_metrics_arguments, add_timing_arguments,
+                        add_transform_arguments, add_window_arguments, add_writer_arguments, describe_window,
+                        has_frame_transform, is_passthrough, open_writer, parse_fps, prescan_fps, profiled,
+                        read_ros2_messages_strided, resolve_time_window, resolve_topic_outputs, transform_frame,
+                        transform_options_from_args, write_frame, writer_options_from_args)
 
 # Attempt to import message types. This works best if your ROS 2 environment is sourced
 # or if you've pip installed the specific message packages.
@@ -14,7 +21,110 @@ except ImportError:
     print("Example: 'pip install sensor-msgs-py'")
     exit(1)
 
-def mcap_to_mp4(mcap_file, topic_name, output_file, fps=30.0, encoding="bgr8"):
+def ros_msg_to_cv2(bridge, ros_msg, encoding="bgr8", topic_name=None):
+    """
+    Converts a deserialized Image or CompressedImage message to an OpenCV image with cv_bridge,
+    falling back to the passthrough encoding if the requested one fails. Returns None if the
+    message can't be converted.
+    """
+    cv_image = None
+    if isinstance(ros_msg, Image):
+        try:
+            cv_image = bridge.imgmsg_to_cv2(ros_msg, desired_encoding=encoding)
+        except Exception as e:
+            print(f"Error converting Image message: {e}")
+            # Try common fallback encodings if default fails
+            try:
+                print(f"Attempting fallback encoding passthrough for {ros_msg.encoding}...")
+                cv_image = bridge.imgmsg_to_cv2(ros_msg, desired_encoding="passthrough")
+                # If image is mono, ensure it's 3-channel for color video codecs
+                if len(cv_image.shape) == 2 or cv_image.shape[2] == 1:
+                   if encoding.lower() in ["bgr8", "rgb8"]: # if user wants color
+                       print("Converting mono image to BGR for color video.")
+                       cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
+            except Exception as e_fallback:
+                print(f"Fallback conversion failed: {e_fallback}")
+                return None
+    elif isinstance(ros_msg, CompressedImage):
+        try:
+            cv_image = bridge.compressed_imgmsg_to_cv2(ros_msg, desired_encoding=encoding)
+        except Exception as e:
+            print(f"Error converting CompressedImage message: {e}")
+            try:
+                print(f"Attempting fallback encoding passthrough for {ros_msg.format}...")
+                cv_image = bridge.compressed_imgmsg_to_cv2(ros_msg, desired_encoding="passthrough")
+                if len(cv_image.shape) == 2 or cv_image.shape[2] == 1:
+                   if encoding.lower() in ["bgr8", "rgb8"]:
+                       print("Converting mono image to BGR for color video.")
+                       cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
+            except Exception as e_fallback:
+                print(f"Fallback conversion failed: {e_fallback}")
+                return None
+    else:
+        print(f"Skipping message of unknown type: {type(ros_msg)} on topic {topic_name}")
+        return None
+
+    if cv_image is None:
+        print("CV Image is None after conversion attempt, skipping frame.")
+    return cv_image
+
+def to_writer_channels(cv_image, encoding="bgr8"):
+    """
+    Ensures the frame is 3 channels if the video writer expects color.
+    """
+    if len(cv_image.shape) == 2 and (encoding.lower() in ["bgr8", "rgb8"]):
+         cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
+    elif len(cv_image.shape) == 3 and cv_image.shape[2] == 1 and (encoding.lower() in ["bgr8", "rgb8"]):
+         cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
+    return cv_image
+
+def apply_transform(cv_image, transform_options):
+    """
+    Crops and scales a converted frame per --crop/--scale. cv_bridge always decodes at full size,
+    so unlike create-mpeg2.py this is a plain crop and resize. Returns None if the crop is outside the image.
+    """
+    if not has_frame_transform(transform_options):
+        return cv_image
+    cv_image = transform_frame(cv_image, transform_options)
+    if cv_image.size == 0:
+        print(f"Crop {transform_options['crop']} is outside the image.")
+        return None
+    return cv_image
+
+def open_video_writer(output_file, fps, width, height, writer_options=None, timing="fixed"):
+    """
+    Opens the video writer backend from `writer_options` (OpenCV mp4v by default) for the given
+    frame size, with the given output timing. Returns None if it could not be opened.
+    """
+    return open_writer(output_file, fps, width, height, True, writer_options, timing)
+
+def passthrough_payload(ros_msg):
+    """
+    Returns the still-encoded JPEG/PNG bytes of a CompressedImage for the ffmpeg-passthrough
+    backend, or None for other messages, which can't be passed through.
+    """
+    if not isinstance(ros_msg, CompressedImage):
+        print(f"Warning: ffmpeg-passthrough only handles CompressedImage messages, skipping {type(ros_msg).__name__}.")
+        return None
+    return bytes(ros_msg.data)
+
+def print_video_summary(output_file, image_count, first_msg_time_ns, last_msg_time_ns, fps, timing="fixed"):
+    """
+    Prints the frame count and compares the requested FPS with the rate the messages were logged at.
+    """
+    print(f"Video saved to {output_file} with {image_count} frames.")
+    if first_msg_time_ns and last_msg_time_ns and image_count > 1:
+        duration_s = (last_msg_time_ns - first_msg_time_ns) / 1e9
+        actual_fps = (image_count -1) / duration_s if duration_s > 0 else float('inf')
+        print(f"Message duration in MCAP: {duration_s:.2f} s. Actual average FPS from messages: {actual_fps:.2f}")
+        if timing == "fixed" and abs(actual_fps - fps) > 5: # Arbitrary threshold
+            print(f"Warning: Specified FPS ({fps}) differs significantly from detected average FPS ({actual_fps:.2f}). Playback speed might be affected.")
+    elif image_count <= 1:
+         print(f"Warning: Only {image_count} frame(s) processed. Video might be very short or empty.")
+
+def mcap_to_mp4(mcap_file, topic_name, output_file, fps=30.0, encoding="bgr8", writer_options=None,
+                start_time_ns=None, end_time_ns=None, limit_frames=None, timing="fixed", transform_options=None,
+                metrics=None):
     """
     Converts an image topic from an MCAP file to an MP4 video.
 
@@ -22,10 +132,29 @@ def mcap_to_mp4(mcap_file, topic_name, output_file, fps=30.0, encoding="bgr8"):
         mcap_file (str): Path to the input MCAP file.
         topic_name (str): The image topic to extract (e.g., "/camera/image_raw").
         output_file (str): Path to the output MP4 file.
-        fps (float): Frames per second for the output video.
+        fps (float): Frames per second for the output video, or "auto" to detect it from the message index.
         encoding (str): Desired OpenCV encoding (e.g., "bgr8", "mono8").
+        writer_options (dict): Video writer backend and encoder settings (see mcap_video.DEFAULT_WRITER_OPTIONS).
+        start_time_ns (int): If given, messages logged before this time are skipped without being read.
+        end_time_ns (int): If given, messages logged at or after this time are skipped without being read.
+        limit_frames (int): If given, stop after writing this many frames.
+        timing (str): Output timing mode, see mcap_video.TIMING_MODES.
+        transform_options (dict): Downscaling, cropping and frame striding (see mcap_video.DEFAULT_TRANSFORM_OPTIONS).
+        metrics (ConversionMetrics): If given, collects stage timings and skipped frames. cv_bridge
+            decodes and converts colors in one call, so "decode" covers both; "color" is --crop/--scale
+            and the channel fix-up for the writer.
+
+    Returns:
+        int: Number of frames written.
     """
     bridge = CvBridge()
+    passthrough = is_passthrough(writer_options)
+    if metrics is None:
+        metrics = ConversionMetrics()
+    metrics.context.update(mcap_file=mcap_file, topic=topic_name, output_file=output_file)
+    every_nth = transform_options["every_nth"] if transform_options else 1
+    if fps == "auto":
+        fps = prescan_fps(mcap_file, [topic_name], start_time_ns, end_time_ns, every_nth=every_nth)[topic_name]
     video_writer = None
     image_count = 0
     first_msg_time_ns = None
@@ -33,55 +162,56 @@ def mcap_to_mp4(mcap_file, topic_name, output_file, fps=30.0, encoding="bgr8"):
 
     print(f"Reading MCAP file: {mcap_file}")
     print(f"Looking for topic: {topic_name}")
+    window = describe_window(start_time_ns, end_time_ns, limit_frames)
+    if window:
+        print(f"Clip: {window}")
 
     try:
-        for msg_container in read_ros2_messages(mcap_file, topics=[topic_name]):
-            ros_msg = msg_container.ros_message
+        messages = iter(read_ros2_messages_strided(mcap_file, [topic_name], start_time_ns, end_time_ns, every_nth))
+        while True:
+            start = time.perf_counter()
+            msg_container = next(messages, None)
+            if msg_container is None:
+                break
+            metrics.add("read", time.perf_counter() - start)
+            ros_msg = msg_container.ros_msg
             log_time_ns = msg_container.log_time_ns # Log time of the message
 
             if first_msg_time_ns is None:
                 first_msg_time_ns = log_time_ns
             last_msg_time_ns = log_time_ns
 
-            cv_image = None
-            if isinstance(ros_msg, Image):
-                try:
-                    cv_image = bridge.imgmsg_to_cv2(ros_msg, desired_encoding=encoding)
-                except Exception as e:
-                    print(f"Error converting Image message: {e}")
-                    # Try common fallback encodings if default fails
-                    try:
-                        print(f"Attempting fallback encoding passthrough for {ros_msg.encoding}...")
-                        cv_image = bridge.imgmsg_to_cv2(ros_msg, desired_encoding="passthrough")
-                        # If image is mono, ensure it's 3-channel for color video codecs
-                        if len(cv_image.shape) == 2 or cv_image.shape[2] == 1:
-                           if encoding.lower() in ["bgr8", "rgb8"]: # if user wants color
-                               print("Converting mono image to BGR for color video.")
-                               cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
-                    except Exception as e_fallback:
-                        print(f"Fallback conversion failed: {e_fallback}")
-                        continue
-            elif isinstance(ros_msg, CompressedImage):
-                try:
-                    cv_image = bridge.compressed_imgmsg_to_cv2(ros_msg, desired_encoding=encoding)
-                except Exception as e:
-                    print(f"Error converting CompressedImage message: {e}")
-                    try:
-                        print(f"Attempting fallback encoding passthrough for {ros_msg.format}...")
-                        cv_image = bridge.compressed_imgmsg_to_cv2(ros_msg, desired_encoding="passthrough")
-                        if len(cv_image.shape) == 2 or cv_image.shape[2] == 1:
-                           if encoding.lower() in ["bgr8", "rgb8"]:
-                               print("Converting mono image to BGR for color video.")
-                               cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
-                    except Exception as e_fallback:
-                        print(f"Fallback conversion failed: {e_fallback}")
-                        continue
-            else:
-                print(f"Skipping message of unknown type: {type(ros_msg)} on topic {topic_name}")
+            if passthrough:
+                frame = passthrough_payload(ros_msg)
+                if frame is None:
+                    metrics.skip("not_passthrough_compatible")
+                    continue
+                if video_writer is None:
+                    video_writer = open_video_writer(output_file, fps, None, None, writer_options, timing)
+                    if video_writer is None:
+                        return
+                start = time.perf_counter()
+                write_frame(video_writer, frame, log_time_ns)
+                metrics.add("write", time.perf_counter() - start)
+                metrics.frame_written()
+                image_count += 1
+                if image_count % 100 == 0:
+                    print(f"Processed {image_count} frames...")
+                if limit_frames and image_count >= limit_frames:
+                    print(f"Reached frame limit of {limit_frames}. Stopping.")
+                    break
                 continue
 
+            start = time.perf_counter()
+            cv_image = ros_msg_to_cv2(bridge, ros_msg, encoding, topic_name)
+            metrics.add("decode", time.perf_counter() - start)
             if cv_image is None:
-                print("CV Image is None after conversion attempt, skipping frame.")
+                metrics.skip("conversion_failed")
+                continue
+            start = time.perf_counter()
+            cv_image = apply_transform(cv_image, transform_options)
+            if cv_image is None:
+                metrics.skip("crop_outside_image")
                 continue
 
             if video_writer is None:
@@ -96,24 +226,22 @@ def mcap_to_mp4(mcap_file, topic_name, output_file, fps=30.0, encoding="bgr8"):
                         cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
 
 
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v') # or 'XVID', 'MJPG', etc.
-                video_writer = cv2.VideoWriter(output_file, fourcc, fps, (width, height))
-                if not video_writer.isOpened():
-                    print(f"Error: Could not open video writer for {output_file}")
+                video_writer = open_video_writer(output_file, fps, width, height, writer_options, timing)
+                if video_writer is None:
                     return
-                print(f"Video writer initialized: {width}x{height} @ {fps} FPS, Codec: mp4v")
-
-            # Ensure frame is 3 channels if video writer expects color
-            if len(cv_image.shape) == 2 and (encoding.lower() in ["bgr8", "rgb8"]):
-                 cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
-            elif len(cv_image.shape) == 3 and cv_image.shape[2] == 1 and (encoding.lower() in ["bgr8", "rgb8"]):
-                 cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
 
-
-            video_writer.write(cv_image)
+            cv_image = to_writer_channels(cv_image, encoding)
+            metrics.add("color", time.perf_counter() - start)
+            start = time.perf_counter()
+            write_frame(video_writer, cv_image, log_time_ns)
+            metrics.add("write", time.perf_counter() - start)
+            metrics.frame_written()
             image_count += 1
             if image_count % 100 == 0:
                 print(f"Processed {image_count} frames...")
+            if limit_frames and image_count >= limit_frames:
+                print(f"Reached frame limit of {limit_frames}. Stopping.")
+                break
 
     except FileNotFoundError:
         print(f"Error: MCAP file not found at {mcap_file}")
@@ -122,32 +250,173 @@ def mcap_to_mp4(mcap_file, topic_name, output_file, fps=30.0, encoding="bgr8"):
         print(f"An unexpected error occurred: {e}")
     finally:
         if video_writer is not None:
-            video_writer.release()
-            print(f"Video saved to {output_file} with {image_count} frames.")
-            if first_msg_time_ns and last_msg_time_ns and image_count > 1:
-                duration_s = (last_msg_time_ns - first_msg_time_ns) / 1e9
-                actual_fps = (image_count -1) / duration_s if duration_s > 0 else float('inf')
-                print(f"Message duration in MCAP: {duration_s:.2f} s. Actual average FPS from messages: {actual_fps:.2f}")
-                if abs(actual_fps - fps) > 5: # Arbitrary threshold
-                    print(f"Warning: Specified FPS ({fps}) differs significantly from detected average FPS ({actual_fps:.2f}). Playback speed might be affected.")
-            elif image_count <=1 and video_writer is not None:
-                 print(f"Warning: Only {image_count} frame(s) processed. Video might be very short or empty.")
+            try:
+                video_writer.release()
+                print_video_summary(output_file, image_count, first_msg_time_ns, last_msg_time_ns, fps, timing)
+            except RuntimeError as e:
+                print(f"Error: {e}")
         elif image_count == 0:
             print(f"No images found on topic '{topic_name}' in '{mcap_file}'. No video created.")
 
+    return image_count
+
+
+def mcap_to_mp4_multi(mcap_file, topic_outputs, fps=30.0, encoding="bgr8", queue_size=8, writer_options=None,
+                      start_time_ns=None, end_time_ns=None, limit_frames=None, timing="fixed", transform_options=None):
+    """
+    Converts several image topics to one MP4 each in a single pass over the MCAP file.
+    Frames are converted in the reading thread; each output is encoded by its own writer thread.
+
+    Args:
+        mcap_file (str): Path to the input MCAP file.
+        topic_outputs (dict): Topic name -> output MP4 file.
+        fps (float): Frames per second for the output videos, or "auto" to detect it per topic from the message index.
+        encoding (str): Desired OpenCV encoding (e.g., "bgr8", "mono8").
+        queue_size (int): Frames buffered per writer before the reader waits.
+        writer_options (dict): Video writer backend and encoder settings (see mcap_video.DEFAULT_WRITER_OPTIONS).
+        start_time_ns (int): If given, messages logged before this time are skipped without being read.
+        end_time_ns (int): If given, messages logged at or after this time are skipped without being read.
+        limit_frames (int): If given, stop after this many frames per topic.
+        timing (str): Output timing mode, see mcap_video.TIMING_MODES.
+        transform_options (dict): Downscaling, cropping and frame striding (see mcap_video.DEFAULT_TRANSFORM_OPTIONS).
+
+    Returns:
+        dict: Topic name -> number of frames written.
+    """
+    bridge = CvBridge()
+
+    every_nth = transform_options["every_nth"] if transform_options else 1
+    if fps == "auto":
+        topic_fps = prescan_fps(mcap_file, list(topic_outputs), start_time_ns, end_time_ns, every_nth=every_nth)
+    else:
+        topic_fps = dict.fromkeys(topic_outputs, fps)
+
+    def writer_opener(topic):
+        def open_writer(output_file, width, height):
+            return open_video_writer(output_file, topic_fps[topic], width, height, writer_options, timing)
+        return open_writer
+
+    writers = {topic: FrameWriterThread(output_file, writer_opener(topic), queue_size) for topic, output_file in topic_outputs.items()}
+    first_msg_time_ns = dict.fromkeys(topic_outputs)
+    last_msg_time_ns = dict.fromkeys(topic_outputs)
+    queued = dict.fromkeys(topic_outputs, 0)
+
+    print(f"Reading MCAP file: {mcap_file}")
+    for topic, output_file in topic_outputs.items():
+        print(f"Looking for topic: {topic} -> {output_file}")
+    window = describe_window(start_time_ns, end_time_ns, limit_frames)
+    if window:
+        print(f"Clip: {window}")
+
+    for writer in writers.values():
+        writer.start()
+    try:
+        for msg_container in read_ros2_messages_strided(mcap_file, list(topic_outputs), start_time_ns, end_time_ns, every_nth):
+            ros_msg = msg_container.ros_msg
+            topic = msg_container.channel.topic
+            log_time_ns = msg_container.log_time_ns
+
+            if limit_frames and queued[topic] >= limit_frames:
+                continue
+
+            if first_msg_time_ns[topic] is None:
+                first_msg_time_ns[topic] = log_time_ns
+            last_msg_time_ns[topic] = log_time_ns
+
+            if is_passthrough(writer_options):
+                frame = passthrough_payload(ros_msg)
+            else:
+                frame = ros_msg_to_cv2(bridge, ros_msg, encoding, topic)
+                if frame is not None:
+                    frame = apply_transform(frame, transform_options)
+                if frame is not None:
+                    frame = to_writer_channels(frame, encoding)
+            if frame is None:
+                continue
+            writers[topic].put(frame, log_time_ns)
+            queued[topic] += 1
+            if limit_frames and all(count >= limit_frames for count in queued.values()):
+                print(f"Reached frame limit of {limit_frames}. Stopping.")
+                break
+
+    except FileNotFoundError:
+        print(f"Error: MCAP file not found at {mcap_file}")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    for topic, writer in writers.items():
+        if writer.video_writer is not None:
+            print_video_summary(writer.output_file, writer.image_count, first_msg_time_ns[topic], last_msg_time_ns[topic], topic_fps[topic], timing)
+        elif writer.image_count == 0:
+            print(f"No images found on topic '{topic}' in '{mcap_file}'. No video created.")
+
+    return {topic: writer.image_count for topic, writer in writers.items()}
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Convert an image topic from an MCAP file to an MP4 video.")
+    parser = argparse.ArgumentParser(description="Convert image topics from an MCAP file to MP4 videos.")
     parser.add_argument("mcap_file", help="Path to the input MCAP file.")
-    parser.add_argument("topic_name", help="Image topic name (e.g., /camera/image_raw).")
-    parser.add_argument("output_file", help="Path to the output MP4 file.")
-    parser.add_argument("--fps", type=float, default=30.0, help="Frames per second for the output video (default: 30.0).")
+    parser.add_argument("topic_name", nargs="?",
+                        help="Image topic name (e.g., /camera/image_raw), or a glob such as '/camera/*/compressed'.")
+    parser.add_argument("output_file", nargs="?",
+                        help="Path to the output MP4 file. When topic_name is a glob, use '{topic}' in the name "
+                             "(e.g., out/{topic}.mp4).")
+    parser.add_argument("--topic", action="append", default=[], metavar="TOPIC=OUTPUT",
+                        help="Additional topic (or glob) and output file; may be repeated. All topics are "
+                             "extracted in one pass over the file.")
+    parser.add_argument("--fps", type=parse_fps, default=30.0,
+                        help="Frames per second for the output video, or 'auto' to detect it from the MCAP message "
+                             "index before writing (default: 30.0).")
     parser.add_argument("--encoding", type=str, default="bgr8", help="Desired OpenCV encoding for frames (e.g., bgr8, rgb8, mono8, passthrough) (default: bgr8).")
+    add_writer_arguments(parser)
+    add_window_arguments(parser)
+    add_timing_arguments(parser)
+    add_transform_arguments(parser)
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
+    writer_options = writer_options_from_args(args)
+    transform_options = transform_options_from_args(args)
+    if bool(args.topic_name) != bool(args.output_file):
+        parser.error("topic_name and output_file must be given together")
+    if not args.topic_name and not args.topic:
+        parser.error("give topic_name and output_file, or at least one --topic TOPIC=OUTPUT")
+    if args.every_nth < 1:
+        parser.error("--every-nth must be at least 1")
+    if is_passthrough(writer_options) and has_frame_transform(transform_options):
+        parser.error("--scale and --crop need decoded frames, so they can't be used with --backend ffmpeg-passthrough")
 
     # It's generally best to run this in an environment where ROS 2 is sourced
     # or where cv_bridge and sensor_msgs can be found by Python.
     # For example, source /opt/ros/<distro>/setup.bash
 
-    mcap_to_mp4(args.mcap_file, args.topic_name, args.output_file, args.fps, args.encoding)
\ No newline at end of file
+    try:
+        start_time_ns, end_time_ns = resolve_time_window(args.mcap_file, args.start, args.end)
+    except (ValueError, FileNotFoundError) as e:
+        parser.error(str(e))
+    multi_topic = bool(args.topic) or any(c in args.topic_name for c in "*?[")
+    collect_metrics = args.metrics_json is not None or args.progress is not None
+    if collect_metrics and multi_topic:
+        parser.error("--metrics-json and --progress cover the single-topic converter only")
+
+    run_options = {"start_time_ns": start_time_ns, "end_time_ns": end_time_ns, "limit_frames": args.limit_frames, "timing": args.timing,
+                   "transform_options": transform_options}
+
+    if multi_topic:
+        try:
+            topic_outputs = resolve_topic_outputs(args.mcap_file, args.topic_name, args.output_file, args.topic)
+        except (ValueError, FileNotFoundError) as e:
+            parser.error(str(e))
+        with profiled(args.profile):
+            mcap_to_mp4_multi(args.mcap_file, topic_outputs, args.fps, args.encoding, writer_options=writer_options, **run_options)
+    else:
+        metrics = ConversionMetrics(args.progress) if collect_metrics else None
+        with profiled(args.profile):
+            mcap_to_mp4(args.mcap_file, args.topic_name, args.output_file, args.fps, args.encoding, writer_options,
+                        metrics=metrics, **run_options)
+        if metrics is not None:
+            metrics.print_summary()
+            if args.metrics_json:
+                metrics.write_json(args.metrics_json)
@@ -1,7 +1,17 @@
 import argparse
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
 import cv2
 import numpy as np
-from mcap_ros2.reader import read_ros2_messages # mcap-ros2-support handles deserialization
+
+from mcap_video import (REDUCED_IMREAD_FLAGS, ConversionMetrics, FrameWriterThread, add_metrics_arguments,
+                        add_timing_arguments, add_transform_arguments, add_window_arguments, add_writer_arguments,
+                        describe_window, frame_size, has_frame_transform, is_passthrough, open_writer, parse_fps,
+                        prescan_fps, profiled, read_ros2_messages_strided, reduced_decode_factor, resolve_time_window,
+                        resolve_topic_outputs, transform_frame, transform_options_from_args, write_frame,
+                        writer_options_from_args)
 
 # We will try to get message types from mcap_ros2_support's bundled types
 # or from pip-installed standalone packages if mcap_ros2_support doesn't find them.
@@ -140,9 +150,106 @@ def image_msg_to_cv2_manual(img_info, desired_encoding="bgr8"):
 
     return cv_image
 
-def compressed_imgmsg_to_cv2_manual(img_info, desired_encoding="bgr8"):
+# Raw encodings the fast path understands: encoding -> (channels, dtype)
+RAW_IMAGE_LAYOUTS = {
+    "mono8": (1, np.uint8), "8uc1": (1, np.uint8), "gray": (1, np.uint8), "grey": (1, np.uint8),
+    "mono16": (1, np.uint16), "16uc1": (1, np.uint16),
+    "rgb8": (3, np.uint8), "bgr8": (3, np.uint8),
+    "rgba8": (4, np.uint8), "bgra8": (4, np.uint8),
+}
+
+# (source encoding, desired encoding) -> OpenCV conversion code. Reordering channels, dropping
+# alpha and converting to gray are all a single SIMD pass in cvtColor, which also reads
+# padded rows directly, so it doubles as the one copy into the output frame.
+_COLOR_CONVERSIONS = {
+    ("rgb8", "bgr8"): cv2.COLOR_RGB2BGR, ("rgba8", "bgr8"): cv2.COLOR_RGBA2BGR, ("bgra8", "bgr8"): cv2.COLOR_BGRA2BGR,
+    ("bgr8", "rgb8"): cv2.COLOR_BGR2RGB, ("rgba8", "rgb8"): cv2.COLOR_RGBA2RGB, ("bgra8", "rgb8"): cv2.COLOR_BGRA2RGB,
+    ("rgb8", "mono8"): cv2.COLOR_RGB2GRAY, ("bgr8", "mono8"): cv2.COLOR_BGR2GRAY,
+    ("rgba8", "mono8"): cv2.COLOR_RGBA2GRAY, ("bgra8", "mono8"): cv2.COLOR_BGRA2GRAY,
+}
+
+def raw_image_view(img_info):
+    """
+    Returns a read-only (height, width, channels) view straight on the message buffer of a raw
+    Image (from get_image_info), or None if the encoding is unknown or the buffer is too short.
+    Row padding (step > width * pixel size) is handled with strides, and big-endian data gets a
+    big-endian dtype, so nothing is copied here.
+    """
+    encoding = img_info["encoding"].lower()
+    if encoding not in RAW_IMAGE_LAYOUTS:
+        return None
+    channels, dtype = RAW_IMAGE_LAYOUTS[encoding]
+    dtype = np.dtype(dtype).newbyteorder(">" if img_info["is_bigendian"] else "<")
+
+    height, width, step = img_info["height"], img_info["width"], img_info["step"]
+    row_bytes = width * channels * dtype.itemsize
+    data = img_info["data"]
+    if isinstance(data, list):
+        data = np.array(data, dtype=np.uint8) # unavoidable copy for list-typed data
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if height == 0 or step < row_bytes or buffer.size < step * (height - 1) + row_bytes:
+        return None
+
+    rows = np.lib.stride_tricks.as_strided(buffer, shape=(height, row_bytes), strides=(step, 1), writeable=False)
+    return rows.view(dtype).reshape(height, width, channels)
+
+def image_msg_to_cv2_fast(img_info, desired_encoding="bgr8", out=None, crop=None):
+    """
+    Fast path for raw ROS Images: converts straight from the message buffer with at most one
+    copy, into `out` when it has the right shape and dtype (so a caller can reuse one frame).
+    Channel reordering (or byte swapping, for big-endian data) happens in that same copy.
+    Returns None when the encoding pair is not covered, so callers can fall back to
+    image_msg_to_cv2_manual. `crop` (x, y, width, height) is sliced out of the message buffer
+    before anything is copied.
+    """
+    if img_info is None or img_info["type"] != "Image":
+        return None
+    desired_encoding = desired_encoding.lower()
+    if desired_encoding not in ["bgr8", "rgb8", "mono8"]:
+        return None
+    src = raw_image_view(img_info)
+    if src is None:
+        return None
+    if crop is not None:
+        x, y, crop_width, crop_height = crop
+        src = src[y:y + crop_height, x:x + crop_width]
+        if src.size == 0:
+            return None
+
+    encoding = img_info["encoding"].lower()
+    height, width, channels = src.shape
+    out_dtype = src.dtype.newbyteorder("=")
+    is_color_output = desired_encoding in ["bgr8", "rgb8"]
+    shape = (height, width, 3) if is_color_output else (height, width)
+
+    if channels == 1:
+        src = src[..., 0]
+        conversion = cv2.COLOR_GRAY2BGR if is_color_output else None
+    elif encoding == desired_encoding:
+        conversion = None
+    elif (encoding, desired_encoding) in _COLOR_CONVERSIONS:
+        conversion = _COLOR_CONVERSIONS[(encoding, desired_encoding)]
+    else:
+        return None
+
+    if conversion is not None and src.dtype != out_dtype:
+        src = src.astype(out_dtype) # big-endian: OpenCV can't byteswap, so swap first
+
+    if out is None or out.shape != shape or out.dtype != out_dtype or not out.flags.writeable:
+        if conversion is None and src.dtype == out_dtype and src.flags.c_contiguous:
+            return src # already in the output layout: no copy at all
+        out = np.empty(shape, dtype=out_dtype)
+
+    if conversion is None:
+        np.copyto(out, src) # byteswaps on the fly for big-endian data
+    else:
+        cv2.cvtColor(src, conversion, dst=out)
+    return out
+
+def compressed_imgmsg_to_cv2_manual(img_info, desired_encoding="bgr8", reduction=1):
     """
     Manually decodes ROS CompressedImage data (from get_image_info) to an OpenCV image.
+    With `reduction` 2, 4 or 8 the image is decoded directly at that fraction of its size.
     """
     if img_info is None or img_info["type"] != "CompressedImage":
         return None
@@ -158,7 +265,7 @@ def compressed_imgmsg_to_cv2_manual(img_info, desired_encoding="bgr8"):
     else:
         raise TypeError(f"Unsupported data type for compressed image data: {type(data)}")
 
-    cv_image = cv2.imdecode(image_data_np, cv2.IMREAD_COLOR) # IMREAD_COLOR tries to make it 3-channel BGR
+    cv_image = cv2.imdecode(image_data_np, REDUCED_IMREAD_FLAGS[reduction]) # IMREAD_COLOR tries to make it 3-channel BGR
 
     if cv_image is None:
         print("cv2.imdecode failed. Invalid compressed data or unsupported format.")
@@ -173,8 +280,106 @@ def compressed_imgmsg_to_cv2_manual(img_info, desired_encoding="bgr8"):
 
     return cv_image
 
-def mcap_to_mp4_standalone(mcap_file, topic_name, output_file, fps=30.0, desired_cv_encoding="bgr8"):
+def convert_image_info(img_meta_info, desired_cv_encoding="bgr8", out=None, transform_options=None, metrics=None):
+    """
+    Converts an image info dict (from get_image_info) to a frame ready for the video writer,
+    i.e. decoded, cropped/scaled per `transform_options` and with the channel layout matching
+    `desired_cv_encoding`. Raw Images are written into `out` when possible (see image_msg_to_cv2_fast).
+    If `metrics` (a ConversionMetrics) is given, the decode and color stages are timed into it.
+    """
+    start = time.perf_counter()
+    cv_image = None
+    crop = transform_options["crop"] if transform_options else None
+    cropped = False
+    decoded_factor = 1
+    if img_meta_info["type"] == "Image":
+        cv_image = image_msg_to_cv2_fast(img_meta_info, desired_encoding=desired_cv_encoding, out=out, crop=crop)
+        cropped = cv_image is not None
+        if cv_image is None:
+            cv_image = image_msg_to_cv2_manual(img_meta_info, desired_encoding=desired_cv_encoding)
+    elif img_meta_info["type"] == "CompressedImage":
+        if has_frame_transform(transform_options):
+            decoded_factor = reduced_decode_factor(transform_options["scale"])
+        cv_image = compressed_imgmsg_to_cv2_manual(img_meta_info, desired_encoding=desired_cv_encoding, reduction=decoded_factor)
+
+    if metrics is not None:
+        metrics.add("decode", time.perf_counter() - start)
+        start = time.perf_counter()
+    if cv_image is None:
+        return None
+    if has_frame_transform(transform_options):
+        cv_image = transform_frame(cv_image, transform_options, decoded_factor, cropped)
+        if cv_image.size == 0:
+            print(f"Crop {crop} is outside the image.")
+            return None
+
+    # Ensure frame format matches video writer's expectation (color/mono)
+    is_color_output = desired_cv_encoding.lower() in ["bgr8", "rgb8"]
+    if is_color_output and (len(cv_image.shape) == 2 or cv_image.shape[2] == 1):
+        cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
+    elif not is_color_output and len(cv_image.shape) == 3 and cv_image.shape[2] > 1:
+        cv_image = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY) # Assuming BGR if it's color
+
+    if metrics is not None:
+        metrics.add("color", time.perf_counter() - start)
+    return cv_image
+
+def open_video_writer(output_file, fps, width, height, desired_cv_encoding="bgr8", writer_options=None, timing="fixed"):
+    """
+    Opens the video writer backend from `writer_options` (OpenCV mp4v by default) for the given
+    frame size, with the given output timing. Returns None if it could not be opened.
+    """
+    is_color_output = desired_cv_encoding.lower() in ["bgr8", "rgb8"]
+    return open_writer(output_file, fps, width, height, is_color_output, writer_options, timing)
+
+def passthrough_payload(img_meta_info):
+    """
+    Returns the still-encoded JPEG/PNG bytes of a CompressedImage for the ffmpeg-passthrough
+    backend, or None for raw Images, which can't be passed through.
+    """
+    if img_meta_info["type"] != "CompressedImage":
+        print("Warning: ffmpeg-passthrough only handles CompressedImage messages, skipping frame.")
+        return None
+    return bytes(img_meta_info["data"])
+
+def print_video_summary(output_file, image_count, first_msg_time_ns, last_msg_time_ns, fps, timing="fixed"):
+    """
+    Prints the frame count and compares the requested FPS with the rate the messages were logged at.
+    """
+    print(f"Video saved to {output_file} with {image_count} frames.")
+    if first_msg_time_ns and last_msg_time_ns and image_count > 1:
+        duration_s = (last_msg_time_ns - first_msg_time_ns) / 1e9
+        actual_fps = (image_count -1) / duration_s if duration_s > 0 else float('inf')
+        print(f"Message duration in MCAP: {duration_s:.2f} s. Actual average FPS from messages: {actual_fps:.2f}")
+        if timing == "fixed" and abs(actual_fps - fps) > 5:
+            print(f"Warning: Specified FPS ({fps}) differs significantly from detected average FPS ({actual_fps:.2f}). Playback speed might be affected.")
+    elif image_count <= 1:
+        print(f"Warning: Only {image_count} frame(s) processed. Video might be very short or empty.")
+
+def mcap_to_mp4_standalone(mcap_file, topic_name, output_file, fps=30.0, desired_cv_encoding="bgr8", workers=0, writer_options=None,
+                           start_time_ns=None, end_time_ns=None, limit_frames=None, timing="fixed", transform_options=None,
+                           metrics=None):
+    """
+    Converts one image topic to a video in a single loop (or hands off to mcap_to_mp4_pipelined
+    when `workers` > 1). Stage timings, written frames and skipped frames are collected into
+    `metrics` (a mcap_video.ConversionMetrics) if one is given. Returns the number of frames written.
+    """
+    if workers and workers > 1:
+        return mcap_to_mp4_pipelined(mcap_file, topic_name, output_file, fps, desired_cv_encoding, workers=workers, writer_options=writer_options,
+                                     start_time_ns=start_time_ns, end_time_ns=end_time_ns, limit_frames=limit_frames, timing=timing,
+                                     transform_options=transform_options)
+    passthrough = is_passthrough(writer_options)
+    every_nth = transform_options["every_nth"] if transform_options else 1
+    if fps == "auto":
+        fps = prescan_fps(mcap_file, [topic_name], start_time_ns, end_time_ns, every_nth=every_nth)[topic_name]
+
+    if metrics is None:
+        metrics = ConversionMetrics()
+    metrics.context.update(mcap_file=mcap_file, topic=topic_name, output_file=output_file)
     video_writer = None
+    frame_buffer = None # reused for raw Images; VideoWriter.write copies the frame before returning
+    # cfr may write the previous frame again, so it must stay intact; scaled frames are new arrays anyway.
+    reuse_frames = timing != "cfr" and not (transform_options and transform_options["scale"] != 1.0)
     image_count = 0
     first_msg_time_ns = None
     last_msg_time_ns = None
@@ -182,68 +387,75 @@ def mcap_to_mp4_standalone(mcap_file, topic_name, output_file, fps=30.0, desired
     print(f"Reading MCAP file: {mcap_file}")
     print(f"Looking for topic: {topic_name}")
     print(f"Desired OpenCV encoding for video frames: {desired_cv_encoding}")
+    window = describe_window(start_time_ns, end_time_ns, limit_frames)
+    if window:
+        print(f"Clip: {window}")
 
     try:
         # `mcap_ros2_support` will attempt to deserialize messages
         # based on bundled IDL definitions or those it can find.
-        # The `ros_message` attribute will be the deserialized message object.
-        for msg_container in read_ros2_messages(mcap_file, topics=[topic_name]):
-            ros_msg = msg_container.ros_message # This is the deserialized object
+        # The `ros_msg` attribute will be the deserialized message object.
+        messages = iter(read_ros2_messages_strided(mcap_file, [topic_name], start_time_ns, end_time_ns, every_nth))
+        while True:
+            start = time.perf_counter()
+            msg_container = next(messages, None)
+            if msg_container is None:
+                break
+            metrics.add("read", time.perf_counter() - start)
+            ros_msg = msg_container.ros_msg # This is the deserialized object
             log_time_ns = msg_container.log_time_ns
 
             if ros_msg is None:
                 print(f"Warning: Failed to deserialize message on topic {topic_name} at time {log_time_ns}. Schema might be missing or corrupted.")
+                metrics.skip("deserialize_failed")
                 continue
 
             if first_msg_time_ns is None:
                 first_msg_time_ns = log_time_ns
             last_msg_time_ns = log_time_ns
 
+            start = time.perf_counter()
             img_meta_info = get_image_info(ros_msg)
+            metrics.add("image_info", time.perf_counter() - start)
             if not img_meta_info:
                 # print(f"Skipping non-image or unsupported message type: {type(ros_msg)}")
+                metrics.skip("unsupported_message_type")
                 continue
 
-            cv_image = None
-            if img_meta_info["type"] == "Image":
-                cv_image = image_msg_to_cv2_manual(img_meta_info, desired_encoding=desired_cv_encoding)
-            elif img_meta_info["type"] == "CompressedImage":
-                cv_image = compressed_imgmsg_to_cv2_manual(img_meta_info, desired_encoding=desired_cv_encoding)
-
-            if cv_image is None:
-                print("Failed to convert ROS message to CV image, skipping frame.")
-                continue
+            if passthrough:
+                cv_image = passthrough_payload(img_meta_info)
+                if cv_image is None:
+                    metrics.skip("not_passthrough_compatible")
+                    continue
+            else:
+                cv_image = convert_image_info(img_meta_info, desired_cv_encoding, out=frame_buffer, transform_options=transform_options,
+                                              metrics=metrics)
+                if cv_image is None:
+                    print("Failed to convert ROS message to CV image, skipping frame.")
+                    metrics.skip("conversion_failed")
+                    continue
+                if reuse_frames and cv_image.flags.owndata:
+                    frame_buffer = cv_image
 
             if video_writer is None:
-                height, width = cv_image.shape[:2]
-                # Ensure 3 channels if BGR8/RGB8 is expected by codec, even if original was mono
-                # This check should ideally be based on `desired_cv_encoding`
-                is_color_output = desired_cv_encoding.lower() in ["bgr8", "rgb8"]
-                
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v') # or 'XVID', 'avc1'
-                video_writer = cv2.VideoWriter(output_file, fourcc, fps, (width, height), is_color=is_color_output)
-                if not video_writer.isOpened():
-                    print(f"Error: Could not open video writer for {output_file}")
-                    return
-                print(f"Video writer initialized: {width}x{height} @ {fps} FPS. Color: {is_color_output}")
-
-
-            # Ensure frame format matches video writer's expectation (color/mono)
-            is_color_output = desired_cv_encoding.lower() in ["bgr8", "rgb8"]
-            if is_color_output and (len(cv_image.shape) == 2 or cv_image.shape[2] == 1):
-                cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
-            elif not is_color_output and len(cv_image.shape) == 3 and cv_image.shape[2] > 1:
-                cv_image = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY) # Assuming BGR if it's color
-
-
-            video_writer.write(cv_image)
+                width, height = frame_size(cv_image)
+                video_writer = open_video_writer(output_file, fps, width, height, desired_cv_encoding, writer_options, timing)
+                if video_writer is None:
+                    return image_count
+
+            start = time.perf_counter()
+            write_frame(video_writer, cv_image, log_time_ns)
+            metrics.add("write", time.perf_counter() - start)
+            metrics.frame_written()
             image_count += 1
             if image_count % 100 == 0:
                 print(f"Processed {image_count} frames...")
+            if limit_frames and image_count >= limit_frames:
+                print(f"Reached frame limit of {limit_frames}. Stopping.")
+                break
 
     except FileNotFoundError:
         print(f"Error: MCAP file not found at {mcap_file}")
-        return
     except ImportError as e:
         print(f"ImportError: {e}. A required Python package might be missing.")
         print("Try: pip install mcap-ros2-support numpy opencv-python")
@@ -253,30 +465,293 @@ def mcap_to_mp4_standalone(mcap_file, topic_name, output_file, fps=30.0, desired
         traceback.print_exc()
     finally:
         if video_writer is not None:
-            video_writer.release()
-            print(f"Video saved to {output_file} with {image_count} frames.")
-            if first_msg_time_ns and last_msg_time_ns and image_count > 1:
-                duration_s = (last_msg_time_ns - first_msg_time_ns) / 1e9
-                actual_fps = (image_count -1) / duration_s if duration_s > 0 else float('inf')
-                print(f"Message duration in MCAP: {duration_s:.2f} s. Actual average FPS from messages: {actual_fps:.2f}")
-                if abs(actual_fps - fps) > 5:
-                    print(f"Warning: Specified FPS ({fps}) differs significantly from detected average FPS ({actual_fps:.2f}). Playback speed might be affected.")
-            elif image_count <=1 and video_writer is not None :
-                 print(f"Warning: Only {image_count} frame(s) processed. Video might be very short or empty.")
-
+            try:
+                video_writer.release()
+                print_video_summary(output_file, image_count, first_msg_time_ns, last_msg_time_ns, fps, timing)
+            except RuntimeError as e:
+                print(f"Error: {e}")
         elif image_count == 0:
             print(f"No images found or processed on topic '{topic_name}' in '{mcap_file}'. No video created.")
 
+    return image_count
+
+# --- Pipelined / multi-topic mode ---
+#
+# reader (main thread)  ->  decode (worker processes, or inline)  ->  one writer thread per topic
+#
+# All requested topics come out of a single read_ros2_messages pass. The reader submits
+# decode jobs in log_time order and keeps the futures in a FIFO, so every writer receives
+# its frames in order no matter which worker finishes first. Both the number of in-flight
+# decode jobs and each writer queue are bounded, which caps memory at roughly
+# (queue_size * (1 + number of topics)) frames.
+
+def _init_decode_worker():
+    # Each process decodes one frame at a time; let the pool provide the parallelism
+    # instead of OpenCV's own thread pool, which would oversubscribe the cores.
+    cv2.setNumThreads(1)
+
+def _decode_worker(img_meta_info, desired_cv_encoding, transform_options=None):
+    start = time.perf_counter()
+    cv_image = convert_image_info(img_meta_info, desired_cv_encoding, transform_options=transform_options)
+    return cv_image, time.perf_counter() - start
+
+def _passthrough_worker(img_meta_info):
+    return passthrough_payload(img_meta_info), 0.0
+
+def _run_inline(fn, *args):
+    future = Future()
+    future.set_result(fn(*args))
+    return future
+
+def _print_stage_throughput(wall_s, stages):
+    print(f"Pipeline throughput ({wall_s:.2f} s wall):")
+    width = max(len(name) for name, frames, busy_s in stages)
+    for name, frames, busy_s in stages:
+        rate = frames / busy_s if busy_s > 0 else float('inf')
+        print(f"  {name:<{width}} {frames:>8} frames  busy {busy_s:8.2f} s  {rate:10.1f} frames/s")
+    if wall_s > 0:
+        written = sum(frames for name, frames, busy_s in stages if name.startswith("write"))
+        print(f"  {'overall':<{width}} {written / wall_s:>8.1f} frames/s")
+
+def mcap_to_mp4_multi(mcap_file, topic_outputs, fps=30.0, desired_cv_encoding="bgr8", workers=0, queue_size=None, writer_options=None,
+                      start_time_ns=None, end_time_ns=None, limit_frames=None, timing="fixed", transform_options=None,
+                      raise_errors=False):
+    """
+    Converts several image topics to one video each, reading the MCAP file once.
+
+    Args:
+        mcap_file (str): Path to the input MCAP file.
+        topic_outputs (dict): Topic name -> output MP4 file.
+        fps (float): Frames per second for the output videos, or "auto" to detect it per topic from the message index.
+        desired_cv_encoding (str): Desired OpenCV encoding for video frames.
+        workers (int): Decode processes. 0 or 1 decodes in the reader thread; the writers still run concurrently.
+        queue_size (int): Bound for in-flight decode jobs and for each writer queue (default: 4 * workers, at least 8).
+        writer_options (dict): Video writer backend and encoder settings (see mcap_video.DEFAULT_WRITER_OPTIONS).
+        start_time_ns (int): If given, messages logged before this time are skipped without being read.
+        end_time_ns (int): If given, messages logged at or after this time are skipped without being read.
+        limit_frames (int): If given, stop after handing this many frames per topic to the decoder.
+        timing (str): Output timing mode, see mcap_video.TIMING_MODES.
+        transform_options (dict): Downscaling, cropping and frame striding (see mcap_video.DEFAULT_TRANSFORM_OPTIONS).
+        raise_errors (bool): Re-raise a read error, or raise RuntimeError if a video could not be written, once
+            the partial videos are closed and summarized, instead of only printing it and returning partial counts.
+
+    Returns:
+        dict: Topic name -> number of frames written.
+    """
+    queue_size = queue_size or max(8, workers * 4)
+    every_nth = transform_options["every_nth"] if transform_options else 1
+    if fps == "auto":
+        topic_fps = prescan_fps(mcap_file, list(topic_outputs), start_time_ns, end_time_ns, every_nth=every_nth)
+    else:
+        topic_fps = dict.fromkeys(topic_outputs, fps)
+
+    def writer_opener(topic):
+        def open_writer(output_file, width, height):
+            return open_video_writer(output_file, topic_fps[topic], width, height, desired_cv_encoding, writer_options, timing)
+        return open_writer
+
+    writers = {topic: FrameWriterThread(output_file, writer_opener(topic), queue_size) for topic, output_file in topic_outputs.items()}
+    first_msg_time_ns = dict.fromkeys(topic_outputs)
+    last_msg_time_ns = dict.fromkeys(topic_outputs)
+    submitted = dict.fromkeys(topic_outputs, 0)
+    read_count = 0
+    read_s = 0.0
+    decode_count = 0
+    decode_s = 0.0
+    failed_count = 0
+
+    print(f"Reading MCAP file: {mcap_file}")
+    for topic, output_file in topic_outputs.items():
+        print(f"Looking for topic: {topic} -> {output_file}")
+    print(f"Desired OpenCV encoding for video frames: {desired_cv_encoding}")
+    if workers > 1:
+        print(f"Pipelined mode: {workers} decode workers, queue size {queue_size}")
+    window = describe_window(start_time_ns, end_time_ns, limit_frames)
+    if window:
+        print(f"Clip: {window}")
+
+    for writer in writers.values():
+        writer.start()
+    pending = deque()
+    wall_start = time.perf_counter()
+
+    def hand_oldest_to_writer():
+        nonlocal decode_count, decode_s, failed_count
+        topic, log_time_ns, future = pending.popleft()
+        cv_image, busy_s = future.result()
+        decode_s += busy_s
+        if cv_image is None:
+            failed_count += 1
+            if not is_passthrough(writer_options):
+                print(f"Failed to convert ROS message on {topic} to CV image, skipping frame.")
+            return
+        decode_count += 1
+        writers[topic].put(cv_image, log_time_ns)
+
+    pool = None
+    error = None
+    try:
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_decode_worker)
+        submit = pool.submit if pool else _run_inline
+
+        messages = iter(read_ros2_messages_strided(mcap_file, list(topic_outputs), start_time_ns, end_time_ns, every_nth))
+        while True:
+            start = time.perf_counter()
+            msg_container = next(messages, None)
+            if msg_container is None:
+                break
+            ros_msg = msg_container.ros_msg
+            topic = msg_container.channel.topic
+            log_time_ns = msg_container.log_time_ns
+
+            if limit_frames and submitted[topic] >= limit_frames:
+                continue
+            if ros_msg is None:
+                print(f"Warning: Failed to deserialize message on topic {topic} at time {log_time_ns}. Schema might be missing or corrupted.")
+                continue
+
+            img_meta_info = get_image_info(ros_msg)
+            if not img_meta_info:
+                continue
+            if pool and isinstance(img_meta_info["data"], list):
+                img_meta_info["data"] = bytes(img_meta_info["data"]) # much cheaper to pickle
+            read_s += time.perf_counter() - start
+            read_count += 1
+
+            if first_msg_time_ns[topic] is None:
+                first_msg_time_ns[topic] = log_time_ns
+            last_msg_time_ns[topic] = log_time_ns
+
+            if is_passthrough(writer_options):
+                pending.append((topic, log_time_ns, _run_inline(_passthrough_worker, img_meta_info)))
+            else:
+                pending.append((topic, log_time_ns, submit(_decode_worker, img_meta_info, desired_cv_encoding, transform_options)))
+            submitted[topic] += 1
+            if len(pending) >= queue_size:
+                hand_oldest_to_writer()
+            if limit_frames and all(count >= limit_frames for count in submitted.values()):
+                print(f"Reached frame limit of {limit_frames}. Stopping.")
+                break
+
+        while pending:
+            hand_oldest_to_writer()
+
+    except FileNotFoundError as e:
+        print(f"Error: MCAP file not found at {mcap_file}")
+        error = e
+    except ImportError as e:
+        print(f"ImportError: {e}. A required Python package might be missing.")
+        print("Try: pip install mcap-ros2-support numpy opencv-python")
+        error = e
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        import traceback
+        traceback.print_exc()
+        error = e
+    finally:
+        for topic, log_time_ns, future in pending:
+            future.cancel()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        for writer in writers.values():
+            writer.close()
+        wall_s = time.perf_counter() - wall_start
+
+    stages = [("read", read_count, read_s), ("decode", decode_count + failed_count, decode_s)]
+    for topic, writer in writers.items():
+        if writer.video_writer is not None:
+            print_video_summary(writer.output_file, writer.image_count, first_msg_time_ns[topic], last_msg_time_ns[topic], topic_fps[topic], timing)
+            stages.append((f"write {topic}", writer.image_count, writer.busy_s))
+        elif writer.image_count == 0:
+            print(f"No images found or processed on topic '{topic}' in '{mcap_file}'. No video created.")
+    if read_count:
+        _print_stage_throughput(wall_s, stages)
+
+    if raise_errors:
+        if error is not None:
+            raise error
+        failed_outputs = [writer.output_file for writer in writers.values() if writer.failed]
+        if failed_outputs:
+            raise RuntimeError(f"Could not write {', '.join(failed_outputs)}")
+    return {topic: writer.image_count for topic, writer in writers.items()}
+
+def mcap_to_mp4_pipelined(mcap_file, topic_name, output_file, fps=30.0, desired_cv_encoding="bgr8", workers=2, queue_size=None, writer_options=None,
+                          start_time_ns=None, end_time_ns=None, limit_frames=None, timing="fixed", transform_options=None):
+    """
+    Same conversion as mcap_to_mp4_standalone, but decode and color conversion run in a
+    pool of `workers` processes while reading and writing run concurrently.
+    """
+    counts = mcap_to_mp4_multi(mcap_file, {topic_name: output_file}, fps, desired_cv_encoding, workers, queue_size, writer_options,
+                               start_time_ns=start_time_ns, end_time_ns=end_time_ns, limit_frames=limit_frames, timing=timing,
+                               transform_options=transform_options)
+    return counts[topic_name]
+
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Convert an image topic from an MCAP file to an MP4 video (standalone).")
+    parser = argparse.ArgumentParser(description="Convert image topics from an MCAP file to MP4 videos (standalone).")
     parser.add_argument("mcap_file", help="Path to the input MCAP file.")
-    parser.add_argument("topic_name", help="Image topic name (e.g., /camera/image_raw).")
-    parser.add_argument("output_file", help="Path to the output MP4 file.")
-    parser.add_argument("--fps", type=float, default=30.0, help="Frames per second for the output video (default: 30.0).")
+    parser.add_argument("topic_name", nargs="?",
+                        help="Image topic name (e.g., /camera/image_raw), or a glob such as '/camera/*/compressed'.")
+    parser.add_argument("output_file", nargs="?",
+                        help="Path to the output MP4 file. When topic_name is a glob, use '{topic}' in the name "
+                             "(e.g., out/{topic}.mp4).")
+    parser.add_argument("--topic", action="append", default=[], metavar="TOPIC=OUTPUT",
+                        help="Additional topic (or glob) and output file; may be repeated. All topics are "
+                             "extracted in one pass over the file.")
+    parser.add_argument("--fps", type=parse_fps, default=30.0,
+                        help="Frames per second for the output video, or 'auto' to detect it from the MCAP message "
+                             "index before writing (default: 30.0).")
     parser.add_argument("--encoding", type=str, default="bgr8",
                         help="Desired OpenCV encoding for video frames (e.g., bgr8, rgb8, mono8). "
                              "The script will attempt to convert to this. (default: bgr8)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Number of decode processes. With 2 or more, reading, decoding and writing run as a "
+                             "pipeline; 0 or 1 keeps the serial loop. (default: 0)")
+    add_writer_arguments(parser)
+    add_window_arguments(parser)
+    add_timing_arguments(parser)
+    add_transform_arguments(parser)
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
-    mcap_to_mp4_standalone(args.mcap_file, args.topic_name, args.output_file, args.fps, args.encoding)
\ No newline at end of file
+    writer_options = writer_options_from_args(args)
+    transform_options = transform_options_from_args(args)
+    if bool(args.topic_name) != bool(args.output_file):
+        parser.error("topic_name and output_file must be given together")
+    if not args.topic_name and not args.topic:
+        parser.error("give topic_name and output_file, or at least one --topic TOPIC=OUTPUT")
+    if args.every_nth < 1:
+        parser.error("--every-nth must be at least 1")
+    if is_passthrough(writer_options) and has_frame_transform(transform_options):
+        parser.error("--scale and --crop need decoded frames, so they can't be used with --backend ffmpeg-passthrough")
+
+    try:
+        start_time_ns, end_time_ns = resolve_time_window(args.mcap_file, args.start, args.end)
+    except (ValueError, FileNotFoundError) as e:
+        parser.error(str(e))
+    multi_topic = bool(args.topic) or any(c in args.topic_name for c in "*?[")
+    collect_metrics = args.metrics_json is not None or args.progress is not None
+    if collect_metrics and (multi_topic or args.workers > 1):
+        parser.error("--metrics-json and --progress cover the serial single-topic converter; the pipelined and "
+                     "multi-topic modes print their own per-stage throughput")
+
+    run_options = {"start_time_ns": start_time_ns, "end_time_ns": end_time_ns, "limit_frames": args.limit_frames, "timing": args.timing,
+                   "transform_options": transform_options}
+
+    if multi_topic:
+        try:
+            topic_outputs = resolve_topic_outputs(args.mcap_file, args.topic_name, args.output_file, args.topic)
+        except (ValueError, FileNotFoundError) as e:
+            parser.error(str(e))
+        with profiled(args.profile):
+            mcap_to_mp4_multi(args.mcap_file, topic_outputs, args.fps, args.encoding, workers=args.workers, writer_options=writer_options, **run_options)
+    else:
+        metrics = ConversionMetrics(args.progress) if collect_metrics else None
+        with profiled(args.profile):
+            mcap_to_mp4_standalone(args.mcap_file, args.topic_name, args.output_file, args.fps, args.encoding, workers=args.workers,
+                                   writer_options=writer_options, metrics=metrics, **run_options)
+        if metrics is not None:
+            metrics.print_summary()
+            if args.metrics_json:
+                metrics.write_json(args.metrics_json)
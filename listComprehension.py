@@ -16,11 +16,149 @@
 # print(set2)
 # print(commonLetters)
 
-def getCommonLetters(string1: str, string2: str) -> set:
-    return {x for x in set(string1.lower()) if x in set(string2.lower())}
+"""
+Common letters (case-insensitive) of any number of strings or files.
 
-string1: str = input("Enter first string: ")
-string2: str = input("Enter second string: ")
+Each input is scanned once, a chunk at a time, smallest first: after the first input only
+the letters still in common are looked for, so a scan stops as soon as it has seen them
+all. ASCII chunks go through a 128-bit mask built with NumPy instead of a Python set, and
+files are streamed, so inputs larger than memory work too.
 
-commonLetters: set = getCommonLetters(string1, string2)
-print("Common Letters: " + str(commonLetters))
\ No newline at end of file
+Usage:
+    python listComprehension.py NAINA REENE
+    python listComprehension.py --file a.txt --file b.txt --chunk-size 4194304
+    python listComprehension.py --lines words.txt      # one input per line ('-' for stdin)
+    python listComprehension.py                        # asks for two strings
+"""
+import argparse
+import codecs
+import sys
+from typing import Iterable, Iterator
+
+import numpy as np
+
+CHUNK_SIZE = 1 << 20
+ALL_ASCII = (1 << 128) - 1
+
+def asciiMask(chunk: bytes) -> int:
+    """Bit i is set if chr(i) or its uppercase form occurs in the ASCII `chunk`."""
+    seen = np.zeros(256, dtype=bool)
+    seen[np.frombuffer(chunk, dtype=np.uint8)] = True
+    seen[ord("a"):ord("z") + 1] |= seen[ord("A"):ord("Z") + 1] # same case folding as str.lower() on ASCII
+    seen[ord("A"):ord("Z") + 1] = False
+    return int.from_bytes(np.packbits(seen[:128], bitorder="little").tobytes(), "little")
+
+def maskToLetters(mask: int) -> set:
+    return {chr(i) for i in range(128) if mask >> i & 1}
+
+def lowerSet(text: str) -> set:
+    # Lowercase the distinct characters only, not a copy of the whole text.
+    return {lowered for c in set(text) for lowered in c.lower()}
+
+def textChunks(text: str, chunkSize: int) -> Iterator[str]:
+    return (text[i:i + chunkSize] for i in range(0, len(text), chunkSize))
+
+def scanMask(chunks: Iterable[bytes], candidates: int) -> int:
+    """The candidate letters (a mask) that occur in the ASCII `chunks`; stops once all have."""
+    mask = 0
+    for chunk in chunks:
+        mask |= asciiMask(chunk)
+        if mask & candidates == candidates:
+            break
+    return mask & candidates
+
+def scanLetters(chunks: Iterable[str], candidates: set | None) -> set:
+    """The candidate letters (all letters if None) that occur in `chunks`; stops once all have."""
+    letters: set = set()
+    for chunk in chunks:
+        letters |= lowerSet(chunk)
+        if candidates is not None and candidates <= letters:
+            break
+    return letters if candidates is None else letters & candidates
+
+def getCommonLetters(*strings: str, chunkSize: int = CHUNK_SIZE) -> set:
+    if not strings:
+        return set()
+    strings = tuple(sorted(strings, key=len))
+    if all(string.isascii() for string in strings):
+        common = ALL_ASCII
+        for string in strings:
+            common = scanMask((chunk.encode("ascii") for chunk in textChunks(string, chunkSize)), common)
+            if not common:
+                break
+        return maskToLetters(common)
+
+    common = None
+    for string in strings:
+        common = scanLetters(textChunks(string, chunkSize), common)
+        if not common:
+            break
+    return common
+
+def isAsciiCompatible(encoding: str) -> bool:
+    """True if ASCII bytes decode to the same characters (utf-8, latin-1, ...; not utf-16)."""
+    sample = bytes(range(128))
+    try:
+        return sample.decode(encoding) == sample.decode("ascii") and codecs.lookup(encoding).name != "utf-7"
+    except UnicodeDecodeError:
+        return False
+
+def scanFile(fileName: str, candidates: set | None, encoding: str = "utf-8", chunkSize: int = CHUNK_SIZE) -> set:
+    """
+    scanLetters over a file read `chunkSize` bytes at a time. Pure ASCII chunks take the mask
+    path; others go through an incremental decoder, so multi-byte characters split across
+    chunks still decode correctly.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    asciiFastPath = isAsciiCompatible(encoding)
+    mask = 0
+    letters: set = set()
+    with open(fileName, "rb") as f:
+        while chunk := f.read(chunkSize):
+            if asciiFastPath and chunk.isascii() and not decoder.getstate()[0]:
+                mask |= asciiMask(chunk)
+            else:
+                letters |= lowerSet(decoder.decode(chunk))
+            if candidates is not None and candidates <= letters | maskToLetters(mask):
+                break
+        else:
+            letters |= lowerSet(decoder.decode(b"", final=True))
+    letters |= maskToLetters(mask)
+    return letters if candidates is None else letters & candidates
+
+def getCommonLettersInFiles(fileNames: list[str], encoding: str = "utf-8", chunkSize: int = CHUNK_SIZE) -> set:
+    """getCommonLetters on the contents of files, without reading any of them whole."""
+    common = None
+    for fileName in fileNames:
+        common = scanFile(fileName, common, encoding, chunkSize)
+        if not common:
+            break
+    return common or set()
+
+def readLines(fileName: str, encoding: str) -> list[str]:
+    if fileName == "-":
+        return sys.stdin.read().splitlines()
+    with open(fileName, encoding=encoding) as f:
+        return f.read().splitlines()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the letters (case-insensitive) that all inputs have in common.")
+    parser.add_argument("strings", nargs="*", help="Input strings.")
+    parser.add_argument("--file", dest="files", action="append", default=[],
+                        help="File whose whole contents is one input, streamed in chunks (repeatable).")
+    parser.add_argument("--lines", help="File with one input per line, or '-' for stdin.")
+    parser.add_argument("--encoding", default="utf-8", help="Encoding of --file and --lines (default: utf-8).")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"Bytes read per chunk (default: {CHUNK_SIZE}).")
+    args = parser.parse_args()
+
+    strings: list[str] = args.strings + (readLines(args.lines, args.encoding) if args.lines else [])
+    if not strings and not args.files:
+        string1: str = input("Enter first string: ")
+        string2: str = input("Enter second string: ")
+        strings = [string1, string2]
+
+    commonLetters: set = getCommonLetters(*strings, chunkSize=args.chunk_size) if strings else None
+    if args.files:
+        fileLetters = getCommonLettersInFiles(args.files, args.encoding, args.chunk_size)
+        commonLetters = fileLetters if commonLetters is None else commonLetters & fileLetters
+    print("Common Letters: " + str(sorted(commonLetters)))
@@ -0,0 +1,814 @@
+"""
+Helpers shared by create-mpeg.py and create-mpeg2.py: picking topics and time windows out
+of an MCAP file, detecting frame rates from the message index, frame striding and
+downscaling/cropping, the video writer backends and output timing, the per-topic writer
+thread used when several videos are encoded from one read pass, and per-stage metrics and
+profiling for the serial converters.
+"""
+import cProfile
+import contextlib
+import fnmatch
+import json
+import os
+import pstats
+import queue
+import resource
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+from mcap.reader import make_reader
+from mcap_ros2.decoder import DecoderFactory
+from mcap_ros2.reader import McapROS2Message, read_ros2_messages
+
+def list_topics(mcap_file):
+    """
+    Returns the sorted topic names from the MCAP summary, or None if the file has no summary
+    (e.g. a recording that was not closed cleanly).
+    """
+    with open(mcap_file, "rb") as f:
+        summary = make_reader(f).get_summary()
+    if summary is None:
+        return None
+    return sorted({channel.topic for channel in summary.channels.values()})
+
+def output_for_topic(output_template, topic):
+    """
+    Fills the '{topic}' placeholder of an output file name, e.g.
+    ("out/{topic}.mp4", "/camera/front/compressed") -> "out/camera_front_compressed.mp4".
+    """
+    return output_template.replace("{topic}", topic.strip("/").replace("/", "_"))
+
+def resolve_topic_outputs(mcap_file, topic_pattern=None, output_template=None, pairs=()):
+    """
+    Builds the topic -> output file mapping for a conversion.
+
+    Args:
+        mcap_file (str): Path to the input MCAP file (only read if a glob needs expanding).
+        topic_pattern (str): A topic name or a glob such as "/camera/*/compressed".
+        output_template (str): Output file for `topic_pattern`. Must contain '{topic}' if the glob matches several topics.
+        pairs (list): Extra "TOPIC=OUTPUT" strings; TOPIC may be a glob too.
+
+    Raises:
+        ValueError: If a pair is malformed, or a glob can't be expanded to distinct output files.
+    """
+    requested = []
+    if topic_pattern:
+        requested.append((topic_pattern, output_template))
+    for pair in pairs:
+        topic, sep, output = pair.partition("=")
+        if not sep or not topic or not output:
+            raise ValueError(f"Expected TOPIC=OUTPUT, got '{pair}'")
+        requested.append((topic, output))
+
+    topic_outputs = {}
+    available = None
+    for pattern, output in requested:
+        if not output:
+            raise ValueError(f"No output file given for topic '{pattern}'")
+        if not any(c in pattern for c in "*?["):
+            topic_outputs[pattern] = output_for_topic(output, pattern)
+            continue
+
+        if available is None:
+            available = list_topics(mcap_file)
+            if available is None:
+                raise ValueError(f"'{mcap_file}' has no summary section, so topic patterns can't be expanded. Name the topics explicitly.")
+        matches = fnmatch.filter(available, pattern)
+        if not matches:
+            print(f"Warning: No topics in '{mcap_file}' match '{pattern}'.")
+        elif len(matches) > 1 and "{topic}" not in output:
+            raise ValueError(f"'{pattern}' matches {len(matches)} topics; add a '{{topic}}' placeholder to the output name '{output}'.")
+        for topic in matches:
+            topic_outputs[topic] = output_for_topic(output, topic)
+
+    outputs = list(topic_outputs.values())
+    if len(set(outputs)) != len(outputs):
+        raise ValueError("Several topics map to the same output file.")
+    return topic_outputs
+
+# --- Time windows ---
+#
+# read_ros2_messages(start_time=..., end_time=...) goes through mcap's SeekingReader, which
+# compares each ChunkIndex's message_start_time/message_end_time with the window before
+# touching the chunk. Chunks outside the window are never read, decompressed or deserialized,
+# so a clip costs time proportional to its length, not to the length of the bag.
+
+def add_window_arguments(parser):
+    """Adds the --start/--end/--limit-frames options to an argparse parser."""
+    group = parser.add_argument_group("clip extraction")
+    group.add_argument("--start", type=str, default=None,
+                       help="Start of the clip: seconds from the first message (e.g. 120.5), or an absolute "
+                            "log_time in nanoseconds with an 'ns' suffix (e.g. 1700000000123456789ns).")
+    group.add_argument("--end", type=str, default=None,
+                       help="End of the clip (exclusive), in the same formats as --start.")
+    group.add_argument("--limit-frames", type=int, default=None,
+                       help="Stop after this many frames per output video.")
+
+def parse_time_arg(value):
+    """
+    Parses a --start/--end value. Returns ("absolute", ns) for "<int>ns" and ("offset", ns)
+    for a number of seconds relative to the first message.
+    """
+    value = value.strip()
+    try:
+        if value.endswith("ns"):
+            return "absolute", int(value[:-2])
+        return "offset", int(round(float(value) * 1e9))
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}': use seconds from the first message (e.g. 12.5) or absolute nanoseconds (e.g. 1700000000123456789ns)")
+
+def first_message_time_ns(mcap_file):
+    """
+    log_time of the first message, from the summary statistics (or chunk indexes) when the
+    file has them; otherwise the first message record in the file is read.
+    """
+    with open(mcap_file, "rb") as f:
+        reader = make_reader(f)
+        summary = reader.get_summary()
+        if summary is not None:
+            if summary.statistics is not None and summary.statistics.message_count > 0:
+                return summary.statistics.message_start_time
+            if summary.chunk_indexes:
+                return min(chunk_index.message_start_time for chunk_index in summary.chunk_indexes)
+        first = next(reader.iter_messages(log_time_order=False), None)
+        return first[2].log_time if first is not None else None
+
+def resolve_time_window(mcap_file, start=None, end=None):
+    """
+    Turns --start/--end strings into absolute (start_time_ns, end_time_ns) log_times for
+    read_ros2_messages. Either may be None (open-ended).
+
+    Raises:
+        ValueError: If a value can't be parsed or the window is empty.
+    """
+    parsed = [parse_time_arg(value) if value is not None else None for value in (start, end)]
+    first_ns = None
+    if any(p is not None and p[0] == "offset" for p in parsed):
+        first_ns = first_message_time_ns(mcap_file) or 0
+
+    window = []
+    for p in parsed:
+        if p is None:
+            window.append(None)
+        elif p[0] == "absolute":
+            window.append(p[1])
+        else:
+            window.append(first_ns + p[1])
+    start_time_ns, end_time_ns = window
+    if start_time_ns is not None and end_time_ns is not None and end_time_ns <= start_time_ns:
+        raise ValueError("--end must be after --start")
+    return start_time_ns, end_time_ns
+
+def describe_window(start_time_ns, end_time_ns, limit_frames=None):
+    parts = []
+    if start_time_ns is not None or end_time_ns is not None:
+        parts.append(f"log_time in [{start_time_ns if start_time_ns is not None else '-inf'}, {end_time_ns if end_time_ns is not None else 'inf'}) ns")
+    if limit_frames:
+        parts.append(f"at most {limit_frames} frames per video")
+    return ", ".join(parts)
+
+# --- Frame rate pre-scan ---
+#
+# Every chunk in an indexed MCAP file is followed by one MessageIndex record per channel:
+# a list of (log_time, offset) pairs. Reading just those records gives every message's
+# log_time without decompressing a single chunk or deserializing any payload.
+
+def parse_fps(value):
+    """argparse type for --fps: a positive number, or "auto" to detect it from the message index."""
+    if value == "auto":
+        return value
+    fps = float(value)
+    if fps <= 0:
+        raise ValueError(f"FPS must be positive, got {value}")
+    return fps
+
+def scan_log_times(mcap_file, topics, start_time_ns=None, end_time_ns=None):
+    """
+    Returns {topic: sorted numpy array of log_time_ns} for `topics`, read only from the
+    MessageIndex records. Returns None if the file has no summary or no message indexes.
+    """
+    with open(mcap_file, "rb") as f:
+        summary = make_reader(f).get_summary()
+        if summary is None or not summary.chunk_indexes:
+            return None
+        topic_by_channel = {channel_id: channel.topic for channel_id, channel in summary.channels.items() if channel.topic in topics}
+        times = {topic: [] for topic in topics}
+        indexed = False
+        for chunk_index in summary.chunk_indexes:
+            if start_time_ns is not None and chunk_index.message_end_time < start_time_ns:
+                continue
+            if end_time_ns is not None and chunk_index.message_start_time >= end_time_ns:
+                continue
+            indexed = indexed or bool(chunk_index.message_index_offsets)
+            for channel_id, offset in chunk_index.message_index_offsets.items():
+                if channel_id not in topic_by_channel:
+                    continue
+                # opcode (1) + record length (8) + channel_id (2) + records length (4), then 16-byte entries
+                f.seek(offset + 1 + 8 + 2)
+                (records_length,) = struct.unpack("<I", f.read(4))
+                entries = np.frombuffer(f.read(records_length), dtype="<u8")
+                times[topic_by_channel[channel_id]].append(entries[0::2])
+        if not indexed:
+            return None
+
+    log_times = {}
+    for topic, parts in times.items():
+        merged = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.uint64)
+        if start_time_ns is not None:
+            merged = merged[merged >= start_time_ns]
+        if end_time_ns is not None:
+            merged = merged[merged < end_time_ns]
+        log_times[topic] = merged.astype(np.int64)
+    return log_times
+
+def detect_fps(log_times_ns):
+    """
+    Estimates the camera rate from message log_times. Uses the median interval, so dropped
+    frames (long gaps) don't drag the estimate down. Returns (fps, gap_count) or (None, 0).
+    """
+    if len(log_times_ns) < 2:
+        return None, 0
+    intervals = np.diff(log_times_ns)
+    intervals = intervals[intervals > 0]
+    if len(intervals) == 0:
+        return None, 0
+    median_ns = float(np.median(intervals))
+    gaps = int(np.count_nonzero(intervals > 1.5 * median_ns))
+    return 1e9 / median_ns, gaps
+
+def prescan_fps(mcap_file, topics, start_time_ns=None, end_time_ns=None, default_fps=30.0, every_nth=1):
+    """
+    Detects the frame rate of each topic from the message index before any writer is opened.
+    With frame striding the rate is divided by `every_nth`, so the video still plays in real time.
+    Falls back to `default_fps` for topics (or files) where it can't be determined.
+    """
+    start = time.perf_counter()
+    log_times = scan_log_times(mcap_file, topics, start_time_ns, end_time_ns)
+    if log_times is None:
+        print(f"Warning: '{mcap_file}' has no message index; can't detect FPS, using {default_fps}.")
+        return dict.fromkeys(topics, default_fps)
+
+    topic_fps = {}
+    for topic in topics:
+        fps, gaps = detect_fps(log_times[topic])
+        if fps is None:
+            print(f"Warning: Not enough messages on {topic} to detect FPS, using {default_fps}.")
+            fps = default_fps
+        else:
+            fps = round(fps, 3)
+            print(f"Detected {fps} FPS on {topic} from {len(log_times[topic])} index entries ({gaps} gaps > 1.5x the median interval).")
+            if every_nth > 1:
+                fps = round(fps / every_nth, 3)
+                print(f"Keeping 1 in {every_nth} frames: writing {topic} at {fps} FPS.")
+        topic_fps[topic] = fps
+    print(f"Index pre-scan took {time.perf_counter() - start:.3f} s.")
+    return topic_fps
+
+# --- Frame striding, downscaling and cropping ---
+#
+# --every-nth drops frames before their CDR payload is even deserialized. --scale on JPEG
+# CompressedImages decodes with IMREAD_REDUCED_COLOR_2/4/8, which lets libjpeg skip most of
+# the IDCT work instead of decoding at full size and resizing; only what the reduced decode
+# can't reach exactly is resized afterwards. --crop is given in full-resolution pixels and is
+# a zero-copy slice on raw Images, taken before any color conversion.
+
+DEFAULT_TRANSFORM_OPTIONS = {
+    "scale": 1.0,
+    "crop": None,      # (x, y, width, height) in full-resolution pixels
+    "every_nth": 1,
+}
+
+REDUCED_IMREAD_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def parse_scale(value):
+    """argparse type for --scale: a factor in (0, 1]."""
+    scale = float(value)
+    if not 0 < scale <= 1:
+        raise ValueError(f"Scale must be in (0, 1], got {value}")
+    return scale
+
+def parse_crop(value):
+    """argparse type for --crop: "X,Y,WIDTH,HEIGHT" in full-resolution pixels."""
+    crop = tuple(int(part) for part in value.split(","))
+    if len(crop) != 4 or crop[0] < 0 or crop[1] < 0 or crop[2] <= 0 or crop[3] <= 0:
+        raise ValueError(f"Expected X,Y,WIDTH,HEIGHT with a positive size, got '{value}'")
+    return crop
+
+def add_transform_arguments(parser):
+    """Adds the --scale/--crop/--every-nth options to an argparse parser."""
+    group = parser.add_argument_group("downscaling and frame striding")
+    group.add_argument("--scale", type=parse_scale, default=DEFAULT_TRANSFORM_OPTIONS["scale"],
+                       help="Output size relative to the input, e.g. 0.5 or 0.25. JPEG frames are decoded "
+                            "directly at 1/2, 1/4 or 1/8 size where possible. (default: 1.0)")
+    group.add_argument("--crop", type=parse_crop, default=DEFAULT_TRANSFORM_OPTIONS["crop"], metavar="X,Y,W,H",
+                       help="Region of interest in full-resolution pixels, applied before --scale.")
+    group.add_argument("--every-nth", type=int, default=DEFAULT_TRANSFORM_OPTIONS["every_nth"], metavar="N",
+                       help="Keep only every Nth frame of each topic; the others are never deserialized "
+                            "or decoded. (default: 1)")
+
+def transform_options_from_args(args):
+    return {name: getattr(args, name) for name in DEFAULT_TRANSFORM_OPTIONS}
+
+def has_frame_transform(transform_options):
+    """True if frames have to be cropped or resized after decoding."""
+    return bool(transform_options) and (transform_options["scale"] != 1.0 or transform_options["crop"] is not None)
+
+def reduced_decode_factor(scale):
+    """Largest reduced-decode factor (1, 2, 4 or 8) that doesn't shrink a frame below `scale`."""
+    for factor in (8, 4, 2):
+        if scale * factor <= 1.0 + 1e-9:
+            return factor
+    return 1
+
+def transform_frame(frame, transform_options, decoded_factor=1, cropped=False):
+    """
+    Applies --crop (unless `cropped` says it was already done) and what is left of --scale to a
+    frame that was decoded at 1/`decoded_factor` of its full size. Scaled sizes are rounded to
+    even numbers, which yuv420p encoders require.
+    """
+    if not has_frame_transform(transform_options):
+        return frame
+    crop = transform_options["crop"]
+    if crop is not None and not cropped:
+        x, y, width, height = (value // decoded_factor for value in crop)
+        frame = frame[y:y + height, x:x + width]
+
+    resize = transform_options["scale"] * decoded_factor
+    if abs(resize - 1.0) > 1e-9:
+        height, width = frame.shape[:2]
+        size = (max(2, round(width * resize / 2) * 2), max(2, round(height * resize / 2) * 2))
+        if size != (width, height):
+            return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return np.ascontiguousarray(frame)
+
+def read_ros2_messages_strided(mcap_file, topics, start_time_ns=None, end_time_ns=None, every_nth=1):
+    """
+    Like mcap_ros2.reader.read_ros2_messages, but only every `every_nth` message of each topic
+    is deserialized and yielded. The others are dropped as raw records.
+    """
+    if every_nth <= 1:
+        yield from read_ros2_messages(mcap_file, topics=topics, start_time=start_time_ns, end_time=end_time_ns)
+        return
+
+    decoder_factory = DecoderFactory()
+    decoders = {}
+    seen = {}
+    with open(mcap_file, "rb") as f:
+        for schema, channel, message in make_reader(f).iter_messages(topics=topics, start_time=start_time_ns, end_time=end_time_ns):
+            index = seen.get(channel.id, 0)
+            seen[channel.id] = index + 1
+            if index % every_nth:
+                continue
+            if channel.id not in decoders:
+                decoders[channel.id] = decoder_factory.decoder_for(channel.message_encoding, schema)
+            decoder = decoders[channel.id]
+            ros_msg = decoder(message.data) if decoder is not None else None
+            yield McapROS2Message(ros_msg=ros_msg, message=message, channel=channel, schema=schema)
+
+# --- Video writer backends ---
+#
+# "opencv"             cv2.VideoWriter with the mp4v codec (the original behaviour).
+# "ffmpeg"             raw frames piped into an ffmpeg subprocess, like main.rs does, so any
+#                      ffmpeg codec (libx264 by default) with CRF/preset/threads can be used.
+# "ffmpeg-passthrough" CompressedImage payloads (JPEG/PNG) piped as-is into ffmpeg with
+#                      -f image2pipe; the converters skip decoding in Python entirely.
+
+WRITER_BACKENDS = ["opencv", "ffmpeg", "ffmpeg-passthrough"]
+
+DEFAULT_WRITER_OPTIONS = {
+    "backend": "opencv",
+    "codec": "libx264",
+    "crf": 23,
+    "preset": "medium",
+    "threads": 0,
+}
+
+def add_writer_arguments(parser):
+    """Adds the --backend/--codec/--crf/--preset/--threads options to an argparse parser."""
+    group = parser.add_argument_group("video writer")
+    group.add_argument("--backend", choices=WRITER_BACKENDS, default=DEFAULT_WRITER_OPTIONS["backend"],
+                       help="opencv: cv2.VideoWriter (mp4v). ffmpeg: pipe raw frames to ffmpeg. "
+                            "ffmpeg-passthrough: pipe JPEG/PNG payloads of CompressedImage topics to ffmpeg "
+                            "without decoding them. (default: opencv)")
+    group.add_argument("--codec", type=str, default=DEFAULT_WRITER_OPTIONS["codec"],
+                       help="ffmpeg video codec (default: libx264).")
+    group.add_argument("--crf", type=int, default=DEFAULT_WRITER_OPTIONS["crf"],
+                       help="CRF for libx264/libx265 (0-51, lower is better quality) (default: 23).")
+    group.add_argument("--preset", type=str, default=DEFAULT_WRITER_OPTIONS["preset"],
+                       help="Encoder preset, e.g. ultrafast, veryfast, medium, slow (default: medium).")
+    group.add_argument("--threads", type=int, default=DEFAULT_WRITER_OPTIONS["threads"],
+                       help="ffmpeg encoder threads; 0 lets ffmpeg decide (default: 0).")
+
+def writer_options_from_args(args):
+    return {name: getattr(args, name) for name in DEFAULT_WRITER_OPTIONS}
+
+def is_passthrough(writer_options):
+    return bool(writer_options) and writer_options["backend"] == "ffmpeg-passthrough"
+
+class OpenCVWriter:
+    """cv2.VideoWriter with a fixed fourcc."""
+
+    def __init__(self, output_file, fps, width, height, is_color=True, fourcc="mp4v"):
+        self.writer = cv2.VideoWriter(output_file, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height), is_color)
+        self.description = f"{width}x{height} @ {fps} FPS, Codec: {fourcc}, Color: {is_color}"
+
+    def isOpened(self):
+        return self.writer.isOpened()
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+class FFmpegPipeWriter:
+    """
+    Streams frames into an ffmpeg subprocess through its stdin.
+
+    With input_format="rawvideo", write() takes decoded frames; ffmpeg is started on the first
+    frame, whose shape and dtype pick the input pixel format. With input_format="image2pipe",
+    write_encoded() takes JPEG/PNG bytes and ffmpeg does the decoding.
+    """
+
+    def __init__(self, output_file, fps, input_format="rawvideo", codec="libx264", crf=23, preset="medium", threads=0):
+        self.output_file = output_file
+        self.fps = fps
+        self.input_format = input_format
+        self.codec = codec
+        self.crf = crf
+        self.preset = preset
+        self.threads = threads
+        self.process = None
+        self.description = f"ffmpeg ({input_format} -> {codec}) @ {fps} FPS"
+        if codec in ["libx264", "libx265"]:
+            self.description += f", CRF {crf}, preset {preset}"
+
+    def isOpened(self):
+        return shutil.which("ffmpeg") is not None
+
+    def _command(self, input_args):
+        command = ["ffmpeg", "-y", "-loglevel", "error", "-framerate", str(self.fps)] + input_args + ["-i", "-"]
+        command += ["-c:v", self.codec, "-pix_fmt", "yuv420p"]
+        if self.codec in ["libx264", "libx265"]:
+            command += ["-crf", str(self.crf), "-preset", self.preset]
+        if self.threads:
+            command += ["-threads", str(self.threads)]
+        return command + [self.output_file]
+
+    def _start(self, input_args):
+        self.process = subprocess.Popen(self._command(input_args), stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        if self.process is None:
+            height, width = frame.shape[:2]
+            channels = frame.shape[2] if frame.ndim == 3 else 1
+            pix_fmt = {(1, 1): "gray", (3, 1): "bgr24", (1, 2): "gray16le", (3, 2): "bgr48le"}.get((channels, frame.itemsize))
+            if pix_fmt is None:
+                raise ValueError(f"Unsupported frame layout for ffmpeg: shape {frame.shape}, dtype {frame.dtype}")
+            self._start(["-f", "rawvideo", "-pix_fmt", pix_fmt, "-s", f"{width}x{height}"])
+        self.process.stdin.write(memoryview(frame if frame.flags.c_contiguous else frame.copy()))
+
+    def write_encoded(self, data):
+        if self.process is None:
+            # ffmpeg can't reliably probe a pipe, so name the decoder from the first payload.
+            if data[:2] == b"\xff\xd8":
+                input_codec = "mjpeg"
+            elif data[:8] == b"\x89PNG\r\n\x1a\n":
+                input_codec = "png"
+            else:
+                raise ValueError("ffmpeg-passthrough only supports JPEG and PNG payloads")
+            self._start(["-f", "image2pipe", "-c:v", input_codec])
+        self.process.stdin.write(data)
+
+    def release(self):
+        """Closes ffmpeg's stdin and waits for it; raises RuntimeError if it could not finish the video."""
+        if self.process is None:
+            return
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with status {self.process.returncode} while writing {self.output_file}")
+
+# --- Output timing ---
+#
+# "fixed" one output frame per message at --fps (the original behaviour; drifts when the
+#         camera drops frames).
+# "cfr"   constant rate output driven by log_time: each message lands in the output slot
+#         nearest to its timestamp; empty slots repeat the previous frame and messages that
+#         land in an already-filled slot are dropped, so playback stays in sync.
+# "vfr"   one output frame per message, plus the real timestamps in a Matroska "timestamp
+#         format v2" sidecar. If mkvmerge is installed the video is remuxed into a
+#         variable-frame-rate .mkv with those timestamps.
+
+TIMING_MODES = ["fixed", "cfr", "vfr"]
+
+def add_timing_arguments(parser):
+    """Adds the --timing option to an argparse parser."""
+    parser.add_argument("--timing", choices=TIMING_MODES, default="fixed",
+                        help="fixed: one frame per message at --fps. cfr: duplicate/drop frames by log_time to "
+                             "keep a constant --fps in sync with the recording. vfr: keep real timestamps "
+                             "(sidecar file, remuxed to .mkv if mkvmerge is available). (default: fixed)")
+
+class TimedWriter:
+    """
+    Wraps a video writer and places frames according to their log_time (see TIMING_MODES).
+    Frames go in through write_frame(writer, frame, log_time_ns).
+    """
+
+    def __init__(self, writer, output_file, fps, timing):
+        self.writer = writer
+        self.output_file = output_file
+        self.fps = fps
+        self.timing = timing
+        self.description = f"{writer.description}, timing: {timing}"
+        self.first_ns = None
+        self.next_slot = 0
+        self.last_frame = None
+        self.duplicated = 0
+        self.dropped = 0
+        self.log_times = []
+
+    def write_timed(self, frame, log_time_ns):
+        if self.first_ns is None:
+            self.first_ns = log_time_ns
+        if self.timing == "vfr":
+            write_frame(self.writer, frame)
+            self.log_times.append(log_time_ns)
+            return
+
+        slot = round((log_time_ns - self.first_ns) * self.fps / 1e9)
+        if slot < self.next_slot:
+            self.dropped += 1
+            return
+        while self.next_slot < slot:
+            write_frame(self.writer, self.last_frame)
+            self.duplicated += 1
+            self.next_slot += 1
+        write_frame(self.writer, frame)
+        self.last_frame = frame
+        self.next_slot = slot + 1
+
+    def release(self):
+        self.writer.release()
+        if self.timing == "cfr":
+            print(f"Timing (cfr @ {self.fps} FPS) for {self.output_file}: {self.next_slot} output frames, "
+                  f"{self.duplicated} duplicated, {self.dropped} dropped.")
+        elif self.timing == "vfr" and self.log_times:
+            self._write_timestamps()
+
+    def _write_timestamps(self):
+        timestamps_file = os.path.splitext(self.output_file)[0] + ".timestamps.txt"
+        with open(timestamps_file, "w") as f:
+            f.write("# timestamp format v2\n")
+            for log_time_ns in self.log_times:
+                f.write(f"{(log_time_ns - self.first_ns) / 1e6:.3f}\n")
+        print(f"Frame timestamps for {self.output_file} written to {timestamps_file}.")
+
+        if shutil.which("mkvmerge") is None:
+            print("mkvmerge not found; apply the timestamps with: "
+                  f"mkvmerge -o out.mkv --timestamps 0:{timestamps_file} {self.output_file}")
+            return
+        vfr_file = os.path.splitext(self.output_file)[0] + ".vfr.mkv"
+        result = subprocess.run(["mkvmerge", "-q", "-o", vfr_file, "--timestamps", f"0:{timestamps_file}", self.output_file])
+        if result.returncode in [0, 1]: # 1 means warnings only
+            print(f"Variable frame rate video saved to {vfr_file}.")
+        else:
+            print(f"Error: mkvmerge exited with status {result.returncode} while writing {vfr_file}")
+
+def open_writer(output_file, fps, width, height, is_color=True, writer_options=None, timing="fixed"):
+    """
+    Opens the video writer selected by `writer_options` (see DEFAULT_WRITER_OPTIONS), wrapped
+    in a TimedWriter unless `timing` is "fixed". Returns None, after printing why, if it could
+    not be opened.
+    """
+    options = dict(DEFAULT_WRITER_OPTIONS, **(writer_options or {}))
+    if options["backend"] == "opencv":
+        writer = OpenCVWriter(output_file, fps, width, height, is_color)
+    elif options["backend"] in ["ffmpeg", "ffmpeg-passthrough"]:
+        input_format = "image2pipe" if options["backend"] == "ffmpeg-passthrough" else "rawvideo"
+        writer = FFmpegPipeWriter(output_file, fps, input_format, options["codec"], options["crf"], options["preset"], options["threads"])
+    else:
+        print(f"Error: Unknown writer backend '{options['backend']}'")
+        return None
+
+    if not writer.isOpened():
+        if options["backend"] == "opencv":
+            print(f"Error: Could not open video writer for {output_file}")
+        else:
+            print("Error: ffmpeg was not found on PATH. Install it or use --backend opencv.")
+        return None
+    if timing != "fixed":
+        writer = TimedWriter(writer, output_file, fps, timing)
+    print(f"Video writer initialized for {output_file}: {writer.description}")
+    return writer
+
+def write_frame(video_writer, frame, log_time_ns=None):
+    """
+    Writes a decoded frame, or the encoded payload (bytes) for the passthrough backend.
+    TimedWriters also get the frame's log_time.
+    """
+    if isinstance(video_writer, TimedWriter):
+        video_writer.write_timed(frame, log_time_ns)
+    elif isinstance(frame, (bytes, bytearray)):
+        video_writer.write_encoded(frame)
+    else:
+        video_writer.write(frame)
+
+def frame_size(frame):
+    """(width, height) of a decoded frame; (None, None) for an encoded payload."""
+    if isinstance(frame, (bytes, bytearray)):
+        return None, None
+    height, width = frame.shape[:2]
+    return width, height
+
+class FrameWriterThread(threading.Thread):
+    """
+    Writes decoded frames (in the order they are queued) for one output video.
+
+    `open_writer(output_file, width, height)` is called with the size of the first frame and
+    must return an object with write()/release(), or None if the output could not be opened.
+    Queued bytes (JPEG/PNG payloads for the passthrough backend) go to write_encoded() and
+    open the writer with no size. The queue is bounded, so a producer that gets ahead of the
+    encoder blocks instead of buffering the whole bag in memory.
+    """
+
+    def __init__(self, output_file, open_writer, queue_size=8, name=None):
+        super().__init__(name=name or f"writer:{output_file}", daemon=True)
+        self.output_file = output_file
+        self.open_writer = open_writer
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.video_writer = None
+        self.failed = False
+        self.image_count = 0
+        self.busy_s = 0.0
+
+    def run(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            cv_image, log_time_ns = item
+            if self.failed:
+                continue # keep draining so the producer never blocks on a dead writer
+            start = time.perf_counter()
+            try:
+                if self.video_writer is None:
+                    width, height = frame_size(cv_image)
+                    self.video_writer = self.open_writer(self.output_file, width, height)
+                    if self.video_writer is None:
+                        self.failed = True
+                        continue
+                write_frame(self.video_writer, cv_image, log_time_ns)
+            except Exception as e:
+                print(f"Error writing frame to {self.output_file}: {e}")
+                self.failed = True
+                continue
+            self.busy_s += time.perf_counter() - start
+            self.image_count += 1
+            if self.image_count % 100 == 0:
+                print(f"[{self.output_file}] Processed {self.image_count} frames...")
+
+    def put(self, cv_image, log_time_ns=None):
+        self.frames.put((cv_image, log_time_ns)) # blocks while the writer is behind
+
+    def close(self):
+        """
+        Flushes the queue, stops the thread and releases the underlying writer. If finishing
+        the video fails (e.g. ffmpeg can't write the trailer), `failed` is set.
+        """
+        self.frames.put(None)
+        self.join()
+        if self.video_writer is not None:
+            try:
+                self.video_writer.release()
+            except RuntimeError as e:
+                print(f"Error: {e}")
+                self.failed = True
+
+# --- Metrics and profiling ---
+#
+# The serial converters time each stage of every frame with perf_counter and keep the
+# samples, so the summary can give per-frame percentiles rather than just totals:
+#   read        pulling the next message out of the MCAP file, including CDR deserialization
+#   image_info  get_image_info on the deserialized message
+#   decode      imdecode (plus its gray/BGR fix-up) for CompressedImages; for raw Images the
+#               fast path's single copy, which already includes the channel reordering
+#   color       channel normalization and --crop/--scale after decoding
+#   write       handing the frame to the video writer (encoding, for the OpenCV backend)
+
+METRIC_STAGES = ["read", "image_info", "decode", "color", "write"]
+
+def add_metrics_arguments(parser):
+    """Adds the --metrics-json/--progress/--profile options to an argparse parser."""
+    group = parser.add_argument_group("metrics and profiling")
+    group.add_argument("--metrics-json", type=str, default=None, metavar="FILE",
+                       help="Write per-stage timings (p50/p95/p99 per frame), peak RSS and skipped frames by "
+                            "reason as JSON to FILE ('-' for stdout).")
+    group.add_argument("--progress", type=float, default=None, metavar="SECONDS",
+                       help="Print a progress line with the current frame rate every SECONDS.")
+    group.add_argument("--profile", type=str, default=None, metavar="FILE",
+                       help="Run the conversion under cProfile and write the pstats dump to FILE.")
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KB on Linux
+
+class ConversionMetrics:
+    """
+    Collects per-stage timings, written frames and skipped frames (by reason) for one
+    conversion. Stages are the names in METRIC_STAGES; see the comment above them.
+    """
+
+    def __init__(self, progress_interval_s=None):
+        self.progress_interval_s = progress_interval_s
+        self.stage_s = {stage: [] for stage in METRIC_STAGES}
+        self.skipped = Counter()
+        self.frames = 0
+        self.context = {}
+        self.start = time.perf_counter()
+        self.next_progress = self.start + progress_interval_s if progress_interval_s else None
+
+    def add(self, stage, seconds):
+        self.stage_s[stage].append(seconds)
+
+    def skip(self, reason):
+        self.skipped[reason] += 1
+
+    def frame_written(self):
+        self.frames += 1
+        if self.next_progress is not None:
+            now = time.perf_counter()
+            if now >= self.next_progress:
+                elapsed = now - self.start
+                skipped = sum(self.skipped.values())
+                print(f"Progress: {self.frames} frames in {elapsed:.1f} s ({self.frames / elapsed:.1f} frames/s), "
+                      f"{skipped} skipped, peak RSS {peak_rss_mb():.0f} MB")
+                self.next_progress = now + self.progress_interval_s
+
+    def summary(self):
+        """The metrics as a JSON-serializable dict."""
+        wall_s = time.perf_counter() - self.start
+        stages = {}
+        for stage, samples in self.stage_s.items():
+            if not samples:
+                continue
+            samples_ms = np.array(samples) * 1e3
+            p50, p95, p99 = np.percentile(samples_ms, [50, 95, 99])
+            stages[stage] = {
+                "count": len(samples), "total_s": round(float(samples_ms.sum()) / 1e3, 4),
+                "mean_ms": round(float(samples_ms.mean()), 4), "p50_ms": round(float(p50), 4),
+                "p95_ms": round(float(p95), 4), "p99_ms": round(float(p99), 4), "max_ms": round(float(samples_ms.max()), 4),
+            }
+        return dict(self.context, wall_s=round(wall_s, 4), frames=self.frames,
+                    frames_per_s=round(self.frames / wall_s, 2) if wall_s > 0 else None,
+                    peak_rss_mb=round(peak_rss_mb(), 1), skipped=dict(self.skipped), stages=stages)
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"Stage timings per frame ({summary['frames']} frames, {summary['wall_s']:.2f} s wall, peak RSS {summary['peak_rss_mb']:.0f} MB):")
+        for stage, stats in summary["stages"].items():
+            print(f"  {stage:<10} {stats['count']:>8}  total {stats['total_s']:8.2f} s  p50 {stats['p50_ms']:8.3f} ms  "
+                  f"p95 {stats['p95_ms']:8.3f} ms  p99 {stats['p99_ms']:8.3f} ms")
+        for reason, count in summary["skipped"].items():
+            print(f"  skipped ({reason}): {count}")
+
+    def write_json(self, path):
+        """Writes the summary as JSON to `path`, or to stdout if `path` is "-"."""
+        text = json.dumps(self.summary(), indent=2)
+        if path == "-":
+            print(text)
+            return
+        with open(path, "w") as f:
+            f.write(text + "\n")
+        print(f"Metrics written to {path}")
+
+@contextlib.contextmanager
+def profiled(profile_file):
+    """
+    Runs the body under cProfile if `profile_file` is set, then writes the pstats dump there
+    and prints the 20 most expensive calls by cumulative time. Does nothing otherwise.
+    """
+    if not profile_file:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_file)
+        print(f"Profile written to {profile_file} (view with: python -m pstats {profile_file})")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
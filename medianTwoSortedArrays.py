@@ -1,5 +1,12 @@
+import bisect
+from collections import deque
+from typing import Iterable, Iterator, Sequence
+
+import numpy as np
+
 # class Solution:
 def findMedianSortedArrays(nums1: list[int], nums2: list[int]) -> float:
+    # Merge and sort: O((m+n) log(m+n)) time and a full copy. Kept to check the others against.
     combinedArray = nums1 + nums2
     combinedArray.sort()
     arraymid = len(combinedArray) // 2
@@ -8,7 +15,254 @@ def findMedianSortedArrays(nums1: list[int], nums2: list[int]) -> float:
     else:
         return combinedArray[arraymid]
 
-nums1 = [1,2]
-nums2 = [3,4]
-median = findMedianSortedArrays(nums1, nums2)
-print(median)
\ No newline at end of file
+def findMedianSortedArraysFast(nums1: Sequence, nums2: Sequence) -> float:
+    """
+    Median of two sorted sequences in O(log(min(m, n))) time and O(1) extra memory: binary
+    search for the cut of the shorter one that, together with the matching cut of the
+    longer one, splits the merged order into two halves.
+    """
+    if len(nums1) > len(nums2):
+        nums1, nums2 = nums2, nums1
+    m, n = len(nums1), len(nums2)
+    if m + n == 0:
+        raise ValueError("median of two empty arrays")
+    half = (m + n + 1) // 2
+    lo, hi = 0, m
+    while True:
+        i = (lo + hi) // 2 # nums1[:i] and nums2[:j] form the lower half
+        j = half - i
+        left1 = nums1[i - 1] if i > 0 else float("-inf")
+        right1 = nums1[i] if i < m else float("inf")
+        left2 = nums2[j - 1] if j > 0 else float("-inf")
+        right2 = nums2[j] if j < n else float("inf")
+        if left1 > right2:
+            hi = i - 1
+        elif left2 > right1:
+            lo = i + 1
+        elif (m + n) % 2:
+            return max(left1, left2)
+        else:
+            return (max(left1, left2) + min(right1, right2)) / 2
+
+def findMediansBatch(nums1: np.ndarray, nums2: np.ndarray, lengths1: np.ndarray | None = None,
+                     lengths2: np.ndarray | None = None) -> np.ndarray:
+    """
+    Medians of many pairs at once: row r of `nums1` (shape (B, M)) pairs with row r of `nums2`
+    (shape (B, N)); each row must be sorted. For pairs of different lengths, pad the rows and
+    pass the real lengths in `lengths1`/`lengths2`. The same partition search as
+    findMedianSortedArraysFast runs on all rows together, so a batch takes about
+    log2(max(M, N)) NumPy steps. Rows where both arrays are empty give NaN.
+    """
+    nums1 = np.asarray(nums1, dtype=np.float64)
+    nums2 = np.asarray(nums2, dtype=np.float64)
+    batch = nums1.shape[0]
+    if nums2.shape[0] != batch:
+        raise ValueError(f"nums1 has {batch} rows but nums2 has {nums2.shape[0]}")
+    m = np.full(batch, nums1.shape[1]) if lengths1 is None else np.asarray(lengths1)
+    n = np.full(batch, nums2.shape[1]) if lengths2 is None else np.asarray(lengths2)
+    # A zero-width side is never read (all its cuts are at 0), but take_along_axis needs a column.
+    if nums1.shape[1] == 0:
+        nums1 = np.zeros((batch, 1))
+    if nums2.shape[1] == 0:
+        nums2 = np.zeros((batch, 1))
+
+    def at(nums: np.ndarray, index: np.ndarray, length: np.ndarray, outside: float) -> np.ndarray:
+        inside = (index >= 0) & (index < length)
+        values = np.take_along_axis(nums, np.clip(index, 0, nums.shape[1] - 1)[:, None], axis=1)[:, 0]
+        return np.where(inside, values, outside)
+
+    half = (m + n + 1) // 2
+    lo = np.maximum(0, half - n) # searching nums1's cut directly, so no swap is needed per row
+    hi = np.minimum(m, half)
+    done = m + n == 0
+    maxLeft = np.full(batch, np.nan)
+    minRight = np.full(batch, np.nan)
+    while not done.all():
+        i = (lo + hi) // 2
+        j = half - i
+        left1, right1 = at(nums1, i - 1, m, -np.inf), at(nums1, i, m, np.inf)
+        left2, right2 = at(nums2, j - 1, n, -np.inf), at(nums2, j, n, np.inf)
+        tooFar = ~done & (left1 > right2)
+        tooNear = ~done & ~tooFar & (left2 > right1)
+        found = ~done & ~tooFar & ~tooNear
+        hi = np.where(tooFar, i - 1, hi)
+        lo = np.where(tooNear, i + 1, lo)
+        maxLeft = np.where(found, np.maximum(left1, left2), maxLeft)
+        minRight = np.where(found, np.minimum(right1, right2), minRight)
+        done |= found
+    return np.where((m + n) % 2 == 1, maxLeft, (maxLeft + minRight) / 2)
+
+def kthSmallestSortedArrays(arrays: list[Sequence], k: int):
+    """
+    The k-th smallest (0-based) element of several sorted sequences taken together, without
+    merging them. Each step picks the weighted median of the middle elements of the ranges
+    still in play as a pivot, counts around it with bisect, and drops at least a quarter of
+    the remaining elements: O(len(arrays) * log(total)^2) comparisons.
+    """
+    total = sum(len(array) for array in arrays)
+    if not 0 <= k < total:
+        raise IndexError(f"k = {k} is out of range for {total} elements")
+    lo = [0] * len(arrays)
+    hi = [len(array) for array in arrays]
+    while True:
+        middles = sorted((array[(l + h) // 2], h - l) for array, l, h in zip(arrays, lo, hi) if l < h)
+        remaining = sum(weight for _, weight in middles)
+        covered = 0
+        for pivot, weight in middles:
+            covered += weight
+            if 2 * covered >= remaining:
+                break
+        below = [bisect.bisect_left(array, pivot, l, h) for array, l, h in zip(arrays, lo, hi)]
+        upTo = [bisect.bisect_right(array, pivot, l, h) for array, l, h in zip(arrays, lo, hi)]
+        countBelow = sum(b - l for b, l in zip(below, lo))
+        countUpTo = sum(u - l for u, l in zip(upTo, lo))
+        if k < countBelow:
+            hi = below
+        elif k < countUpTo:
+            return pivot
+        else:
+            k -= countUpTo
+            lo = upTo
+
+def findMedianSortedArraysKWay(arrays: list[Sequence]) -> float:
+    """Median of any number of sorted sequences taken together (see kthSmallestSortedArrays)."""
+    total = sum(len(array) for array in arrays)
+    if total == 0:
+        raise ValueError("median of empty arrays")
+    if total % 2:
+        return kthSmallestSortedArrays(arrays, total // 2)
+    return (kthSmallestSortedArrays(arrays, total // 2 - 1) + kthSmallestSortedArrays(arrays, total // 2)) / 2
+
+class RunningMedian:
+    """
+    Median and other order statistics of a changing multiset, e.g. a sliding window over a
+    stream of latencies. Values live in a sorted list of short blocks, with a Fenwick tree
+    over the block lengths to find the k-th value: insert, remove and every query cost
+    O(log n + blockSize) instead of a re-sort. With `window`, inserting into a full
+    structure first evicts the oldest value.
+    """
+    BLOCK_SIZE = 512 # default blockSize; blocks are split when they reach twice it
+
+    def __init__(self, values: Iterable = (), window: int | None = None, blockSize: int = BLOCK_SIZE):
+        if window is not None and window < 1:
+            raise ValueError("window must be at least 1")
+        if blockSize < 1:
+            raise ValueError("blockSize must be at least 1")
+        self.window = window
+        self.blockSize = blockSize
+        self.blocks: list[list] = []
+        self.maxes: list = [] # last value of each block, to bisect for the block of a value
+        self.tree: list[int] = [0] # Fenwick tree over len(block), 1-based
+        self.order: deque = deque() # values in insertion order, for evictOldest
+        for value in values:
+            self.insert(value)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def insert(self, value) -> None:
+        if self.window is not None and len(self.order) >= self.window:
+            self.evictOldest()
+        self.order.append(value)
+        if not self.blocks:
+            self.blocks.append([value])
+            self.maxes.append(value)
+            self.rebuildIndex()
+            return
+        b = min(bisect.bisect_left(self.maxes, value), len(self.blocks) - 1)
+        block = self.blocks[b]
+        bisect.insort(block, value)
+        self.maxes[b] = block[-1]
+        if len(block) >= 2 * self.blockSize:
+            self.blocks[b:b + 1] = [block[:self.blockSize], block[self.blockSize:]]
+            self.maxes[b:b + 1] = [self.blocks[b][-1], self.blocks[b + 1][-1]]
+            self.rebuildIndex()
+        else:
+            self.addToIndex(b, 1)
+
+    def evictOldest(self):
+        """Removes and returns the value inserted longest ago."""
+        value = self.order.popleft()
+        self.discard(value)
+        return value
+
+    def discard(self, value) -> None:
+        # The first block whose max is >= value holds it, if any block does.
+        b = bisect.bisect_left(self.maxes, value)
+        block = self.blocks[b]
+        del block[bisect.bisect_left(block, value)]
+        if block:
+            self.maxes[b] = block[-1]
+            self.addToIndex(b, -1)
+        else:
+            del self.blocks[b], self.maxes[b]
+            self.rebuildIndex()
+
+    def rebuildIndex(self) -> None:
+        tree = [0] + [len(block) for block in self.blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def addToIndex(self, b: int, delta: int) -> None:
+        i = b + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def kth(self, k: int):
+        """The k-th smallest value (0-based; negative k counts from the largest)."""
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError(f"k is out of range for {len(self)} values")
+        b = 0
+        step = 1 << (len(self.blocks).bit_length() - 1)
+        while step: # descend the tree to the block holding the k-th value
+            if b + step < len(self.tree) and self.tree[b + step] <= k:
+                b += step
+                k -= self.tree[b]
+            step >>= 1
+        return self.blocks[b][k]
+
+    def median(self) -> float:
+        """Same result as findMedianSortedArrays on the current values."""
+        if not self.order:
+            raise ValueError("median of no values")
+        middle = len(self) // 2
+        if len(self) % 2:
+            return self.kth(middle)
+        return (self.kth(middle - 1) + self.kth(middle)) / 2
+
+    def percentile(self, q: float) -> float:
+        """The q-th percentile (0-100), interpolated linearly like numpy.percentile."""
+        if not self.order:
+            raise ValueError("percentile of no values")
+        if not 0 <= q <= 100:
+            raise ValueError("q must be between 0 and 100")
+        position = q / 100 * (len(self) - 1)
+        below = int(position)
+        low = self.kth(below)
+        if below == position:
+            return low
+        return low + (self.kth(below + 1) - low) * (position - below)
+
+def slidingMedians(values: Iterable, window: int, blockSize: int = RunningMedian.BLOCK_SIZE) -> Iterator[float]:
+    """The median of every full window of `window` consecutive values."""
+    running = RunningMedian(window=window, blockSize=blockSize)
+    for value in values:
+        running.insert(value)
+        if len(running) == window:
+            yield running.median()
+
+if __name__ == "__main__":
+    nums1 = [1,2]
+    nums2 = [3,4]
+    median = findMedianSortedArrays(nums1, nums2)
+    print(median)
+    print(findMedianSortedArraysFast(nums1, nums2))
+    print(findMedianSortedArraysKWay([nums1, nums2, [5]]))
+    print(findMediansBatch(np.array([nums1, [0, 9]]), np.array([nums2, [1, 2]])))
+    print(list(slidingMedians([5, 1, 4, 2, 3, 9, 7], window=3)))
@@ -0,0 +1,187 @@
+"""
+Per-channel mean and std of an image dataset, for transforms.Normalize.
+
+get_mean_and_std(dataset_path) decodes every image once, the same way the notebooks'
+ImageFolder + Resize((224,224)) + ToTensor pipeline does, in a pool of worker processes.
+Each worker counts the per-channel pixel values of its share of the images (exact, as they
+are uint8) and turns the counts into a mean and sum of squared deviations; the partial
+results are merged with the parallel form of Welford's update (Chan et al.). So the std is
+the true std over all pixels rather than an average of per-image stds. The result is
+cached in a JSON file keyed by the image files (paths, sizes and mtimes) and the resize,
+so rerunning a notebook returns at once unless the data changed.
+
+get_mean_and_std_from_loader does the same single pass over an existing DataLoader.
+
+Usage:
+    python perception/dataset_stats.py ./10monkeys/training/training --workers 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+IMG_EXTENSIONS = (".jpg", ".jpeg", ".png", ".ppm", ".bmp", ".pgm", ".tif", ".tiff", ".webp") # as ImageFolder
+DEFAULT_SIZE = (224, 224)
+CACHE_FILE_NAME = ".dataset_stats.json"
+CACHE_VERSION = 1
+
+class ChannelStats:
+    """Running per-channel count, mean and sum of squared deviations (M2), mergeable."""
+
+    def __init__(self, channels=3):
+        self.count = 0
+        self.mean = np.zeros(channels)
+        self.m2 = np.zeros(channels)
+
+    @classmethod
+    def from_histogram(cls, histogram, scale=1 / 255):
+        """Statistics of uint8 pixels from their value counts per channel, shape (channels, 256)."""
+        stats = cls(histogram.shape[0])
+        stats.count = int(histogram[0].sum())
+        if stats.count:
+            values = np.arange(histogram.shape[1]) * scale
+            stats.mean = histogram @ values / stats.count
+            stats.m2 = (histogram * (values - stats.mean[:, None]) ** 2).sum(axis=1)
+        return stats
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / total)
+        self.m2 = self.m2 + other.m2 + delta**2 * (self.count * other.count / total)
+        self.count = total
+
+    def std(self):
+        return np.sqrt(self.m2 / self.count) if self.count else np.zeros_like(self.m2)
+
+def find_images(dataset_path):
+    """All image files under `dataset_path`, sorted, skipping hidden files and directories."""
+    images = []
+    for directory, subdirectories, files in os.walk(dataset_path, followlinks=True):
+        subdirectories[:] = sorted(d for d in subdirectories if not d.startswith("."))
+        images.extend(os.path.join(directory, f) for f in files
+                      if not f.startswith(".") and f.lower().endswith(IMG_EXTENSIONS))
+    return sorted(images)
+
+def load_image(path, size=DEFAULT_SIZE):
+    """An image as an (H, W, 3) uint8 array, decoded and resized like pil_loader + Resize(size)."""
+    from PIL import Image
+    with open(path, "rb") as f:
+        image = Image.open(f).convert("RGB")
+    if size is not None:
+        image = image.resize((size[1], size[0]), Image.BILINEAR)
+    return np.asarray(image)
+
+def _stats_of_files(paths, size):
+    histogram = np.zeros((3, 256), dtype=np.int64)
+    for path in paths:
+        image = load_image(path, size)
+        for channel in range(3):
+            histogram[channel] += np.bincount(image[..., channel].ravel(), minlength=256)
+    return ChannelStats.from_histogram(histogram) # ToTensor's scaling to [0, 1] happens here
+
+def cache_key(images, size):
+    """Changes whenever an image is added, removed, replaced or touched, or the resize changes."""
+    digest = hashlib.sha256(json.dumps({"version": CACHE_VERSION, "size": size}).encode())
+    for path in images:
+        stat = os.stat(path)
+        digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+def load_cache(cache_file):
+    if not cache_file or not os.path.exists(cache_file):
+        return {}
+    with open(cache_file) as f:
+        return json.load(f)
+
+def save_cache(cache_file, cache):
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, cache_file)
+
+def get_mean_and_std(dataset_path, size=DEFAULT_SIZE, workers=None, cache_file="", files_per_task=64):
+    """
+    Exact per-channel mean and std (lists of floats, RGB) of the images under `dataset_path`
+    after resizing to `size` (height, width; None keeps the original sizes).
+
+    Args:
+        workers: Decoding processes (default: os.cpu_count()); 1 decodes in this process.
+        cache_file: JSON cache (default: .dataset_stats.json in `dataset_path`); None disables it.
+        files_per_task: Images each worker handles per task.
+    """
+    images = find_images(dataset_path)
+    if not images:
+        raise ValueError(f"No images found under {dataset_path}")
+    if cache_file == "":
+        cache_file = os.path.join(dataset_path, CACHE_FILE_NAME)
+    size = list(size) if size is not None else None
+    key = cache_key(images, size)
+    cache = load_cache(cache_file)
+    if key in cache:
+        return cache[key]["mean"], cache[key]["std"]
+
+    workers = workers or os.cpu_count() or 1
+    tasks = [images[i:i + files_per_task] for i in range(0, len(images), files_per_task)]
+    stats = ChannelStats()
+    start = time.perf_counter()
+    if workers == 1:
+        for task in tasks:
+            stats.merge(_stats_of_files(task, size))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for partial in pool.map(_stats_of_files, tasks, [size] * len(tasks)):
+                stats.merge(partial)
+    mean, std = stats.mean.tolist(), stats.std().tolist()
+
+    if cache_file:
+        cache[key] = {"mean": mean, "std": std, "images": len(images), "pixels": stats.count, "size": size,
+                      "dataset": os.path.abspath(dataset_path), "seconds": round(time.perf_counter() - start, 3)}
+        save_cache(cache_file, cache)
+    return mean, std
+
+def get_mean_and_std_from_loader(loader):
+    """
+    Exact per-channel mean and std in one pass over a DataLoader of (images, labels) batches,
+    with images shaped (B, C, H, W). Returns two tensors of shape (C,).
+    """
+    import torch
+    stats = None
+    for images, _ in loader:
+        pixels = images.transpose(0, 1).reshape(images.size(1), -1).double()
+        batch = ChannelStats(pixels.size(0))
+        batch.count = pixels.size(1)
+        mean = pixels.mean(1)
+        batch.mean = mean.cpu().numpy()
+        batch.m2 = ((pixels - mean[:, None]) ** 2).sum(1).cpu().numpy()
+        if stats is None:
+            stats = batch
+        else:
+            stats.merge(batch)
+    if stats is None:
+        raise ValueError("The loader is empty")
+    return torch.tensor(stats.mean, dtype=torch.float32), torch.tensor(stats.std(), dtype=torch.float32)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-channel mean and std of an image dataset, for transforms.Normalize.")
+    parser.add_argument("dataset_path", help="Dataset root, e.g. an ImageFolder directory.")
+    parser.add_argument("--size", type=int, nargs=2, default=list(DEFAULT_SIZE), metavar=("HEIGHT", "WIDTH"),
+                        help="Resize before measuring, like transforms.Resize (default: 224 224).")
+    parser.add_argument("--no-resize", action="store_true", help="Measure the images at their original sizes.")
+    parser.add_argument("--workers", type=int, default=None, help="Decoding processes (default: CPU count).")
+    parser.add_argument("--cache-file", default="", help=f"Cache file (default: <dataset_path>/{CACHE_FILE_NAME}).")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the cache.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    mean, std = get_mean_and_std(args.dataset_path, None if args.no_resize else args.size, args.workers,
+                                 None if args.no_cache else args.cache_file)
+    print(f"mean = [{', '.join(f'{m:.4f}' for m in mean)}]")
+    print(f"std = [{', '.join(f'{s:.4f}' for s in std)}]")
+    print(f"({time.perf_counter() - start:.2f} s)")
@@ -0,0 +1,174 @@
+"""
+Decode-once image cache for the 10monkeys training notebooks.
+
+build_cache decodes and resizes every image of an ImageFolder-style dataset once (in a pool
+of worker processes) into a memory-mapped uint8 array of shape (N, 3, H, W) on disk, with
+the labels and class names in a side index. It is rebuilt only when the image files or the
+size change. Training then reads from the map instead of decoding JPEGs every epoch:
+
+- CachedImageDataset serves (image, label) pairs as uint8 tensors that share memory with
+  the map, so per-sample transforms are only the cheap ones (flip, rotation, dtype +
+  Normalize).
+- iter_batches slices whole normalized batches straight out of the map, for evaluation.
+
+Usage:
+    python perception/tensor_cache.py ./10monkeys/training/training ./cache/train
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+
+from dataset_stats import DEFAULT_SIZE, cache_key, find_images, load_image
+
+IMAGES_FILE = "images.npy"
+LABELS_FILE = "labels.npy"
+INDEX_FILE = "index.json"
+
+def find_samples(dataset_path):
+    """(classes, [(path, label)]) the way ImageFolder finds them: one subdirectory per class."""
+    samples = []
+    for path in find_images(dataset_path):
+        parts = os.path.relpath(path, dataset_path).split(os.sep)
+        if len(parts) > 1: # images directly in the root belong to no class
+            samples.append((path, parts[0]))
+    classes = sorted({class_name for _, class_name in samples})
+    class_to_idx = {class_name: i for i, class_name in enumerate(classes)}
+    return classes, [(path, class_to_idx[class_name]) for path, class_name in samples]
+
+def load_index(cache_dir):
+    index_file = os.path.join(cache_dir, INDEX_FILE)
+    if not os.path.exists(index_file):
+        return None
+    with open(index_file) as f:
+        return json.load(f)
+
+def _fill_images(images_file, start, paths, size):
+    images = np.load(images_file, mmap_mode="r+")
+    for offset, path in enumerate(paths):
+        images[start + offset] = load_image(path, size).transpose(2, 0, 1)
+    images.flush()
+    return len(paths)
+
+def build_cache(dataset_path, cache_dir, size=DEFAULT_SIZE, workers=None, files_per_task=64):
+    """
+    Decodes the dataset into `cache_dir` unless an up-to-date cache is already there, and
+    returns `cache_dir`.
+
+    Args:
+        size: (height, width) every image is resized to, like transforms.Resize(size).
+        workers: Decoding processes (default: os.cpu_count()); 1 decodes in this process.
+        files_per_task: Images each worker decodes per task.
+    """
+    classes, samples = find_samples(dataset_path)
+    if not samples:
+        raise ValueError(f"No images in class subdirectories of {dataset_path}")
+    size = list(size)
+    key = cache_key([path for path, _ in samples], size)
+    index = load_index(cache_dir)
+    if index and index["key"] == key and os.path.exists(os.path.join(cache_dir, IMAGES_FILE)):
+        return cache_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+    start = time.perf_counter()
+    images_file = os.path.join(cache_dir, IMAGES_FILE + ".tmp")
+    shape = (len(samples), 3, size[0], size[1])
+    np.lib.format.open_memmap(images_file, mode="w+", dtype=np.uint8, shape=shape).flush()
+    paths = [path for path, _ in samples]
+    tasks = [(i, paths[i:i + files_per_task]) for i in range(0, len(paths), files_per_task)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for task_start, task_paths in tasks:
+            _fill_images(images_file, task_start, task_paths, size)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_fill_images, [images_file] * len(tasks), *zip(*tasks), [size] * len(tasks)))
+
+    # Index last, so an interrupted build is never mistaken for a finished one.
+    os.replace(images_file, os.path.join(cache_dir, IMAGES_FILE))
+    np.save(os.path.join(cache_dir, LABELS_FILE), np.array([label for _, label in samples], dtype=np.int64))
+    index = {"key": key, "dataset": os.path.abspath(dataset_path), "size": size, "classes": classes,
+             "samples": [os.path.relpath(path, dataset_path) for path in paths]}
+    with open(os.path.join(cache_dir, INDEX_FILE + ".tmp"), "w") as f:
+        json.dump(index, f)
+    os.replace(os.path.join(cache_dir, INDEX_FILE + ".tmp"), os.path.join(cache_dir, INDEX_FILE))
+    print(f"Cached {len(samples)} images ({np.prod(shape) / 1e6:.0f} MB) from {dataset_path} "
+          f"in {time.perf_counter() - start:.1f} s")
+    return cache_dir
+
+def open_cache(cache_dir):
+    """(images, labels) of a cache: a copy-on-write memmap of shape (N, 3, H, W) and an int64 array."""
+    # Copy-on-write gives writable arrays (torch.from_numpy wants those) without copying anything.
+    images = np.load(os.path.join(cache_dir, IMAGES_FILE), mmap_mode="c")
+    labels = np.load(os.path.join(cache_dir, LABELS_FILE))
+    return images, labels
+
+class CachedImageDataset(torch.utils.data.Dataset):
+    """
+    A Dataset over a build_cache directory, a drop-in for ImageFolder + Resize + ToTensor:
+    items are (uint8 tensor of shape (3, H, W), label), so `transform` should start with
+    the tensor transforms (e.g. RandomHorizontalFlip) and end with
+    ConvertImageDtype(torch.float) + Normalize.
+    """
+
+    def __init__(self, cache_dir, transform=None):
+        self.cache_dir = cache_dir
+        self.transform = transform
+        index = load_index(cache_dir)
+        if index is None:
+            raise FileNotFoundError(f"No tensor cache in {cache_dir}; run build_cache first")
+        self.classes = index["classes"]
+        self.class_to_idx = {class_name: i for i, class_name in enumerate(self.classes)}
+        self.images, self.labels = open_cache(cache_dir)
+        self.targets = self.labels.tolist()
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, i):
+        image = torch.from_numpy(self.images[i])
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, self.targets[i]
+
+    def __getstate__(self):
+        # DataLoader workers get the file name, not a pickled copy of the whole map.
+        state = self.__dict__.copy()
+        state["images"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.images, _ = open_cache(self.cache_dir)
+
+def iter_batches(cache_dir, batch_size=128, mean=None, std=None, device="cpu"):
+    """
+    Yields (images, labels) batches in cache order, sliced straight from the map: images are
+    float32 (B, 3, H, W) on `device`, scaled to [0, 1] and, given `mean` and `std`,
+    normalized like transforms.Normalize.
+    """
+    images, labels = open_cache(cache_dir)
+    # (x / 255 - mean) / std == (x - 255 * mean) / (255 * std), applied to the whole batch at once
+    shift = torch.tensor(mean if mean is not None else [0.0] * 3, device=device).view(1, -1, 1, 1) * 255
+    scale = torch.tensor(std if std is not None else [1.0] * 3, device=device).view(1, -1, 1, 1) * 255
+    for start in range(0, len(labels), batch_size):
+        batch = torch.from_numpy(images[start:start + batch_size]).to(device, non_blocking=True)
+        yield (batch.float() - shift) / scale, torch.from_numpy(labels[start:start + batch_size]).to(device)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode and resize an ImageFolder dataset once into a memory-mapped tensor cache.")
+    parser.add_argument("dataset_path", help="Dataset root with one subdirectory per class.")
+    parser.add_argument("cache_dir", help="Directory for images.npy, labels.npy and index.json.")
+    parser.add_argument("--size", type=int, nargs=2, default=list(DEFAULT_SIZE), metavar=("HEIGHT", "WIDTH"),
+                        help="Size every image is resized to (default: 224 224).")
+    parser.add_argument("--workers", type=int, default=None, help="Decoding processes (default: CPU count).")
+    args = parser.parse_args()
+
+    build_cache(args.dataset_path, args.cache_dir, args.size, args.workers)
+    index = load_index(args.cache_dir)
+    print(f"{len(index['samples'])} images in {len(index['classes'])} classes, {args.size[0]}x{args.size[1]}, "
+          f"in {args.cache_dir}")
@@ -0,0 +1,262 @@
+"""
+Training loop for the 10monkeys notebooks, tuned for CPU-only machines.
+
+- make_loader: DataLoader with worker processes, prefetching and persistent workers (and
+  pinned memory when there is a GPU); each worker runs single-threaded.
+- configure_cpu: torch.set_num_threads for the cores the loader workers leave free.
+- train_nn: channels_last model and batches; loss and accuracy are accumulated as tensors
+  on the device and read once per epoch instead of with .item() every step; each epoch
+  reports its throughput in images/s and how much of it was spent waiting for data.
+- CheckpointWriter: the best checkpoint is snapshotted to CPU memory and written by a
+  background thread, so torch.save doesn't stall training (unless the previous one is
+  still being written).
+
+Usage:
+    python perception/training.py ./10monkeys/training/training ./10monkeys/validation/validation --epochs 10 --workers 4
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+
+import torch
+
+from tensor_cache import iter_batches
+
+CHECKPOINT_FILE = "model_best_checkpoint.pth.tar"
+
+DEFAULT_LOADER_OPTIONS = {
+    "batch_size": 32,
+    "num_workers": min(4, os.cpu_count() or 1),
+    "prefetch_factor": 2, # batches each worker prepares ahead
+    "persistent_workers": True, # keep workers (and their open caches) alive between epochs
+    "pin_memory": None, # None: only when CUDA is available
+}
+
+_device = None
+
+def get_device():
+    """cuda:0 if available, else cpu; decided once per process."""
+    global _device
+    if _device is None:
+        _device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    return _device
+
+def configure_cpu(num_threads=None, loader_workers=0):
+    """
+    Sets torch's intra-op thread count: `num_threads`, or by default the cores left over by
+    `loader_workers` DataLoader worker processes. Returns the count.
+    """
+    if num_threads is None:
+        num_threads = max(1, (os.cpu_count() or 1) - loader_workers)
+    torch.set_num_threads(num_threads)
+    return num_threads
+
+def _init_loader_worker(worker_id):
+    # Workers only decode/augment single samples; threads would just compete with training.
+    torch.set_num_threads(1)
+
+def make_loader(dataset, shuffle=False, **options):
+    """A DataLoader over `dataset` with DEFAULT_LOADER_OPTIONS, overridden by `options`."""
+    options = {**DEFAULT_LOADER_OPTIONS, **options}
+    if options["pin_memory"] is None:
+        options["pin_memory"] = torch.cuda.is_available()
+    if options["num_workers"] == 0:
+        # Only valid with worker processes.
+        options.pop("prefetch_factor")
+        options.pop("persistent_workers")
+    else:
+        options.setdefault("worker_init_fn", _init_loader_worker)
+    return torch.utils.data.DataLoader(dataset, shuffle=shuffle, **options)
+
+def _to_cpu(obj):
+    """A copy of `obj` with every tensor cloned to CPU memory, safe to save while training goes on."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {key: _to_cpu(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(value) for value in obj)
+    return obj
+
+class CheckpointWriter:
+    """
+    Writes checkpoints with torch.save on a background thread. save() first waits for the
+    previous checkpoint to be written, then snapshots the state to CPU memory and returns,
+    so at most one snapshot is alive at a time. Files are written to a temporary name and
+    renamed, so a checkpoint on disk is always complete.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self.thread.start()
+
+    def save(self, state, path):
+        self.queue.join() # the previous checkpoint is on disk and its snapshot released
+        if self.error:
+            raise self.error
+        self.queue.put((_to_cpu(state), path))
+
+    def _run(self):
+        while (item := self.queue.get()) is not None:
+            state, path = item
+            try:
+                torch.save(state, path + ".tmp")
+                os.replace(path + ".tmp", path)
+            except Exception as e:
+                self.error = e
+            item = state = None # drop the snapshot before save() can take the next one
+            self.queue.task_done()
+
+    def close(self):
+        """Waits for the last checkpoint to be written."""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+def checkpoint_state(model, epoch, optimizer, best_acc):
+    return {
+        "epoch": epoch + 1,
+        "model": model.state_dict(),
+        "best accuracy": best_acc,
+        "optimizer": optimizer.state_dict(),
+        "comments": "current best model",
+    }
+
+def evaluate_model_on_test_set(model, test_data, device=None, mean=None, std=None, batch_size=128, channels_last=True):
+    """
+    Accuracy (%) of `model` on a tensor cache directory (read with iter_batches, normalized
+    with `mean`/`std`) or on any iterable of (images, labels) batches, e.g. a DataLoader.
+    """
+    device = device or get_device()
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    batches = iter_batches(test_data, batch_size, mean, std, device) if isinstance(test_data, str) else test_data
+    model.eval()
+    correct = torch.zeros((), dtype=torch.long, device=device)
+    total = 0
+
+    with torch.no_grad():
+        for images, labels in batches:
+            images = images.to(device, memory_format=memory_format, non_blocking=True)
+            labels = labels.to(device, non_blocking=True)
+            correct += (model(images).argmax(1) == labels).sum()
+            total += labels.size(0)
+
+    predicted_correctly = correct.item()
+    epoch_acc = 100.00 * predicted_correctly / total
+    print("    - Testing dataset. Got %d out of %d images correctly (%.3f%%)"
+          % (predicted_correctly, total, epoch_acc))
+    return epoch_acc
+
+def train_nn(model, train_loader, test_data, criterion, optimizer, n_epochs, device=None, mean=None, std=None,
+             checkpoint_file=CHECKPOINT_FILE, channels_last=True):
+    """
+    Trains `model` for `n_epochs`, evaluating on `test_data` (see evaluate_model_on_test_set)
+    after every epoch and checkpointing to `checkpoint_file` whenever the test accuracy
+    improves. Returns the model.
+    """
+    device = device or get_device()
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    model.to(device, memory_format=memory_format)
+    best_acc = 0
+    checkpoints = CheckpointWriter()
+
+    try:
+        for epoch in range(n_epochs):
+            print("Epoch Number %d " % (epoch + 1))
+            model.train()
+            running_loss = torch.zeros((), device=device)
+            running_correct = torch.zeros((), dtype=torch.long, device=device)
+            total = 0
+            steps = 0
+            data_wait = 0.0
+            start = fetch_start = time.perf_counter()
+
+            for images, labels in train_loader:
+                data_wait += time.perf_counter() - fetch_start
+                images = images.to(device, memory_format=memory_format, non_blocking=True)
+                labels = labels.to(device, non_blocking=True)
+
+                optimizer.zero_grad(set_to_none=True)
+                outputs = model(images)
+                loss = criterion(outputs, labels)
+                loss.backward()
+                optimizer.step()
+
+                # Stays on the device; read once after the epoch.
+                running_loss += loss.detach()
+                running_correct += (outputs.argmax(1) == labels).sum()
+                total += labels.size(0)
+                steps += 1
+                fetch_start = time.perf_counter()
+
+            epoch_loss = running_loss.item() / max(steps, 1)
+            correct = running_correct.item()
+            epoch_s = time.perf_counter() - start
+            epoch_acc = 100.00 * correct / max(total, 1)
+            print("    - Training dataset. Got %d out of %d images correctly (%.3f%%). Epoch loss: %.3f"
+                  % (correct, total, epoch_acc, epoch_loss))
+            print("    - Throughput: %.1f images/s (%d images in %.1f s, %.0f%% waiting for data)"
+                  % (total / epoch_s, total, epoch_s, 100 * data_wait / epoch_s))
+
+            test_dataset_acc = evaluate_model_on_test_set(model, test_data, device, mean, std, channels_last=channels_last)
+
+            if test_dataset_acc > best_acc:
+                best_acc = test_dataset_acc
+                checkpoints.save(checkpoint_state(model, epoch, optimizer, best_acc), checkpoint_file)
+    finally:
+        checkpoints.close()
+
+    print("Finished")
+    return model
+
+if __name__ == "__main__":
+    import torch.nn as nn
+    import torch.optim as optim
+    import torchvision.models as models
+    import torchvision.transforms as transforms
+
+    from dataset_stats import get_mean_and_std
+    from tensor_cache import CachedImageDataset, build_cache
+
+    parser = argparse.ArgumentParser(description="Fine-tune resnet18 on an ImageFolder dataset, via tensor caches.")
+    parser.add_argument("training_dataset_path")
+    parser.add_argument("test_dataset_path")
+    parser.add_argument("--cache-dir", default="./cache", help="Where the tensor caches go (default: ./cache).")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=DEFAULT_LOADER_OPTIONS["num_workers"],
+                        help=f"DataLoader worker processes (default: {DEFAULT_LOADER_OPTIONS['num_workers']}).")
+    parser.add_argument("--prefetch-factor", type=int, default=DEFAULT_LOADER_OPTIONS["prefetch_factor"],
+                        help="Batches each worker prepares ahead (default: 2).")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="torch intra-op threads (default: CPU count minus --workers).")
+    parser.add_argument("--no-channels-last", action="store_true", help="Keep the default NCHW memory format.")
+    parser.add_argument("--no-pretrained", action="store_true", help="Start from random weights.")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help=f"Best checkpoint file (default: {CHECKPOINT_FILE}).")
+    args = parser.parse_args()
+
+    print(f"Using {configure_cpu(args.threads, args.workers)} torch threads and {args.workers} loader workers on {get_device()}")
+    mean, std = get_mean_and_std(args.training_dataset_path)
+    train_cache = build_cache(args.training_dataset_path, os.path.join(args.cache_dir, "training"))
+    test_cache = build_cache(args.test_dataset_path, os.path.join(args.cache_dir, "validation"))
+    train_transforms = transforms.Compose([
+        transforms.RandomHorizontalFlip(),
+        transforms.RandomRotation(10),
+        transforms.ConvertImageDtype(torch.float),
+        transforms.Normalize(torch.Tensor(mean), torch.Tensor(std)),
+    ])
+    train_dataset = CachedImageDataset(train_cache, transform=train_transforms)
+    train_loader = make_loader(train_dataset, shuffle=True, batch_size=args.batch_size, num_workers=args.workers,
+                               prefetch_factor=args.prefetch_factor)
+
+    model = models.resnet18(weights=None if args.no_pretrained else "DEFAULT")
+    model.fc = nn.Linear(model.fc.in_features, len(train_dataset.classes))
+    loss_fn = nn.CrossEntropyLoss()
+    optimizer = optim.SGD(model.parameters(), lr=0.01, momentum=0.9, weight_decay=0.003)
+    train_nn(model, train_loader, test_cache, loss_fn, optimizer, args.epochs, mean=mean, std=std,
+             checkpoint_file=args.checkpoint, channels_last=not args.no_channels_last)
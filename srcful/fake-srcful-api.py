@@ -0,0 +1,76 @@
+"""
+Local stand-in for the Srcful GraphQL API, for running gateway-monitor.py without touching
+api.srcful.dev. It answers `solar(gwId: ...)` lookups, aliased or not, with a made-up
+latest timestamp per gateway: most are a few seconds old, about one in ten is an hour old
+(offline), and IDs starting with "missing" have no data.
+
+Usage:
+    python srcful/fake-srcful-api.py --port 8080 --latency 0.05 --fail-rate 0.1
+    python srcful/gateway-monitor.py --file gateways.txt --endpoint http://127.0.0.1:8080
+"""
+import argparse
+import json
+import random
+import re
+import time
+import zlib
+from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOOKUP = re.compile(r'(?:(\w+)\s*:\s*)?solar\(gwId:\s*("(?:[^"\\]|\\.)*")\)')
+
+def latestTimestamp(gwId: str) -> str | None:
+    if gwId.startswith("missing"):
+        return None
+    checksum = zlib.crc32(gwId.encode())
+    age = timedelta(hours=1) if checksum % 10 == 0 else timedelta(seconds=checksum % 60)
+    return (datetime.now(timezone.utc) - age).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the real API
+    options: argparse.Namespace
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.options.latency:
+            time.sleep(self.options.latency)
+        if random.random() < self.options.fail_rate:
+            self.reply(503, {"message": "Service Unavailable"})
+            return
+
+        lookups = LOOKUP.findall(json.loads(body).get("query", ""))
+        if self.options.max_aliases and len(lookups) > self.options.max_aliases:
+            self.reply(400, {"errors": [{"message": f"Query has {len(lookups)} fields, at most {self.options.max_aliases} allowed"}]})
+            return
+        derData = {}
+        for alias, literal in lookups:
+            ts = latestTimestamp(json.loads(literal)) # GraphQL string escapes are JSON's
+            derData[alias or "solar"] = {"latest": {"ts": ts}} if ts else None
+        self.reply(200, {"data": {"derData": derData}})
+
+    def reply(self, status: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.options.verbose:
+            super().log_message(format, *args)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a stand-in for the Srcful GraphQL API on localhost.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response (default: 0).")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 503 (default: 0).")
+    parser.add_argument("--max-aliases", type=int, default=0,
+                        help="Reject queries with more lookups than this, like a query complexity limit (default: no limit).")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    FakeApiHandler.options = args
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FakeApiHandler)
+    print(f"Stand-in Srcful API on http://127.0.0.1:{args.port}")
+    server.serve_forever()
@@ -1,23 +1,316 @@
-import requests
+"""
+Online/Offline monitor for a fleet of Srcful gateways.
+
+Gateways are looked up concurrently over one pooled keep-alive httpx.AsyncClient. Many
+`solar(gwId: ...)` lookups go into each GraphQL request as aliased fields (g0: solar(...),
+g1: solar(...), ...), so a few thousand gateways take a few dozen requests. Requests that
+time out or fail with a 429/5xx are retried with exponential backoff. If the API rejects a
+batched query, its gateways are looked up one by one instead.
+
+With --daemon it keeps running on the same client, caches each gateway's latest timestamp
+and status (optionally in --state-file, across restarts), and prints an event only when a
+status flips. Each gateway is rescheduled on its own: an online gateway can't go offline
+before its latest data goes stale, so it isn't checked again until then; offline gateways
+back off; every delay is jittered so checks don't bunch up.
+
+Responses are decoded with orjson when it is installed, and the statuses of a whole round
+are evaluated at once on NumPy datetime64 arrays (see benchmarks/bench_gateway_monitor.py).
+
+Usage:
+    python srcful/gateway-monitor.py 01239e884755621dee 0123abcd...
+    python srcful/gateway-monitor.py --file gateways.txt --concurrency 32 --batch-size 100
+    python srcful/gateway-monitor.py --file gateways.txt --endpoint http://127.0.0.1:8080  # local stand-in API
+    python srcful/gateway-monitor.py --file gateways.txt --daemon --state-file gateway-state.json
+"""
+import argparse
+import asyncio
 import json
+import os
+import random
+import time
+from collections import Counter
 from datetime import datetime, timezone, timedelta
 
-headers = {}
-data = {
-    'query': '{derData { solar(gwId: "01239e884755621dee") { latest { ts } } } }',
-}
-
-response = requests.post('https://api.srcful.dev', headers=headers, json=data)
-response.raise_for_status()
-print(response.status_code)
-latestTimestamp = datetime.strptime(json.loads(response.content.decode('utf-8'))["data"]["derData"]["solar"]["latest"]["ts"], '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc)
-# latestTimestamp = datetime(2025, 5, 2, 5, 32, 47, 392000, tzinfo=timezone.utc) # test timestamp
-currentTimestamp = datetime.now(timezone.utc)
-print(latestTimestamp)
-print(currentTimestamp)
-difference = currentTimestamp - latestTimestamp
-print(difference)
-if currentTimestamp - latestTimestamp > timedelta(minutes=5):
-    print("Offline")
-else:
-    print("Online")
\ No newline at end of file
+import httpx
+import numpy as np
+
+try:
+    import orjson # optional: decodes large batched responses several times faster than json
+except ImportError:
+    orjson = None
+
+DEFAULT_ENDPOINT = "https://api.srcful.dev"
+DEFAULT_GATEWAY = "01239e884755621dee"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class QueryRejected(Exception):
+    """The API answered, but refused the query itself (GraphQL errors and no data)."""
+
+def buildQuery(gwIds: list[str]) -> str:
+    """One GraphQL query with an aliased solar(gwId: ...) lookup per gateway: g0, g1, ..."""
+    # json.dumps quotes and escapes each ID as a GraphQL string literal, so an ID with a quote
+    # or backslash in it can't break the query (or add fields to it).
+    lookups = " ".join(f'g{i}: solar(gwId: {json.dumps(gwId)}) {{ latest {{ ts }} }}' for i, gwId in enumerate(gwIds))
+    return f"{{derData {{ {lookups} }} }}"
+
+def parseTimestamp(ts: str) -> datetime:
+    return datetime.fromisoformat(ts.replace("Z", "+00:00")).astimezone(timezone.utc)
+
+def parseTimestamps(timestamps: list[str | None]) -> np.ndarray:
+    """
+    Parses UTC timestamps like "2025-05-02T05:32:47.392Z" into one datetime64[ms] array, with
+    NaT for None. Timestamps with another UTC offset go through parseTimestamp first.
+    """
+    naive = ["NaT" if ts is None else ts[:-1] if ts.endswith("Z") else parseTimestamp(ts).replace(tzinfo=None).isoformat()
+             for ts in timestamps]
+    return np.array(naive, dtype="datetime64[ms]")
+
+def decodeJson(content: bytes):
+    return orjson.loads(content) if orjson else json.loads(content)
+
+async def postWithRetry(client: httpx.AsyncClient, endpoint: str, query: str, retries: int, backoff: float) -> dict:
+    """
+    POSTs a GraphQL query and returns the decoded JSON body. Timeouts, connection errors and
+    429/5xx responses are retried up to `retries` times, waiting backoff * 2^attempt seconds
+    (with jitter) in between.
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = await client.post(endpoint, json={"query": query})
+            if response.status_code == 400 and "errors" in response.text:
+                return decodeJson(response.content) # GraphQL validation errors; fetchBatch raises QueryRejected
+            if response.status_code not in RETRY_STATUS_CODES:
+                response.raise_for_status()
+                return decodeJson(response.content)
+            error: Exception = httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request, response=response)
+        except (httpx.TimeoutException, httpx.TransportError) as e:
+            error = e
+        if attempt == retries:
+            raise error
+        await asyncio.sleep(backoff * 2**attempt * random.uniform(0.5, 1.5))
+
+async def fetchBatch(client: httpx.AsyncClient, endpoint: str, gwIds: list[str], retries: int, backoff: float) -> dict:
+    """
+    Looks up the latest timestamp of each gateway in one request.
+    Returns {gwId: ts string, or None if the gateway has no data}.
+    """
+    body = await postWithRetry(client, endpoint, buildQuery(gwIds), retries, backoff)
+    derData = (body.get("data") or {}).get("derData")
+    if derData is None:
+        raise QueryRejected("; ".join(error.get("message", str(error)) for error in body.get("errors", [])) or "no data in response")
+    latest = {}
+    for i, gwId in enumerate(gwIds):
+        solar = derData.get(f"g{i}")
+        latest[gwId] = solar["latest"]["ts"] if solar and solar.get("latest") else None
+    return latest
+
+def makeClient(concurrency: int, timeout: float) -> httpx.AsyncClient:
+    """A keep-alive client whose connection pool matches the request concurrency."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(timeout))
+
+async def fetchLatest(gwIds: list[str], endpoint: str = DEFAULT_ENDPOINT, concurrency: int = 16, batchSize: int = 50,
+                      timeout: float = 10.0, retries: int = 3, backoff: float = 0.5, client: httpx.AsyncClient | None = None) -> dict:
+    """
+    Looks up the latest timestamp of every gateway, `concurrency` requests at a time over one
+    pooled client (a new one unless `client` is given). Returns {gwId: ts string | None (no
+    data) | Exception (lookup failed)}.
+    """
+    if client is None:
+        async with makeClient(concurrency, timeout) as client:
+            return await fetchLatest(gwIds, endpoint, concurrency, batchSize, timeout, retries, backoff, client)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results: dict = {}
+
+    async def lookup(batch: list[str]) -> None:
+        try:
+            async with semaphore:
+                results.update(await fetchBatch(client, endpoint, batch, retries, backoff))
+        except QueryRejected as e:
+            if len(batch) == 1:
+                results[batch[0]] = e
+                return
+            # The API may not accept aliased batches (or not this many); fall back to one per request.
+            await asyncio.gather(*(lookup([gwId]) for gwId in batch))
+        except (httpx.HTTPError, ValueError) as e:
+            results.update(dict.fromkeys(batch, e))
+
+    batches = [gwIds[i:i + batchSize] for i in range(0, len(gwIds), batchSize)]
+    await asyncio.gather(*(lookup(batch) for batch in batches))
+    return results
+
+def evaluateStatuses(gwIds: list[str], results: dict, currentTimestamp: datetime,
+                     offlineAfter: timedelta) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Evaluates the fetchLatest results of all `gwIds` in one go. Returns arrays of the status
+    ("Online", "Offline", "No data" or "Error"), the latest timestamp (datetime64[ms]) and the
+    age (timedelta64[ms]) of each gateway; the last two are NaT without data.
+    """
+    values = [results.get(gwId) for gwId in gwIds]
+    failed = np.fromiter((isinstance(value, Exception) for value in values), dtype=bool, count=len(values))
+    latest = parseTimestamps([value if isinstance(value, str) else None for value in values])
+    age = np.datetime64(currentTimestamp.astimezone(timezone.utc).replace(tzinfo=None), "ms") - latest
+    offline = age > np.timedelta64(offlineAfter) # False for NaT
+    statuses = np.select([failed, np.isnat(latest), offline], ["Error", "No data", "Offline"], "Online")
+    return statuses, latest, age
+
+def formatLatest(latest: np.datetime64) -> str:
+    return "-" if np.isnat(latest) else f"{np.datetime_as_string(latest, unit='s')}+00:00"
+
+def formatAge(age: np.timedelta64) -> str:
+    return "-" if np.isnat(age) else str(age.astype("timedelta64[s]").item())
+
+def printTable(gwIds: list[str], results: dict, offlineAfter: timedelta) -> dict:
+    """Prints one row per gateway and returns the count per status."""
+    statuses, latest, age = evaluateStatuses(gwIds, results, datetime.now(timezone.utc), offlineAfter)
+    print(f"{'gateway':<24} {'status':<8} {'latest':<26} age")
+    for gwId, status, latestTimestamp, difference in zip(gwIds, statuses.tolist(), latest, age):
+        if status == "Error":
+            error = results[gwId]
+            print(f"{gwId:<24} {status:<8} {'-':<26} {type(error).__name__}: {error}")
+        else:
+            print(f"{gwId:<24} {status:<8} {formatLatest(latestTimestamp):<26} {formatAge(difference)}")
+    names, counts = np.unique(statuses, return_counts=True)
+    return dict(zip(names.tolist(), counts.tolist()))
+
+# --- Daemon mode ---
+
+def nextCheckDelay(state: dict, now: float, offlineAfter: timedelta, interval: float, maxInterval: float) -> float:
+    """
+    Seconds until a gateway is worth checking again, from its cached state:
+    - Online: not before its latest data goes stale (latest + offlineAfter), since it can't flip sooner.
+    - Offline: `interval`, doubling with every further offline check.
+    - No data / failed lookups: `interval`.
+    The result is kept within [interval, maxInterval] and jittered by +-10%.
+    """
+    if state["status"] == "Online":
+        delay = parseTimestamp(state["ts"]).timestamp() + offlineAfter.total_seconds() - now
+    elif state["status"] == "Offline":
+        delay = interval * 2 ** min(state["offlineChecks"], 16)
+    else:
+        delay = interval
+    return min(max(delay, interval), maxInterval) * random.uniform(0.9, 1.1)
+
+def loadState(fileName: str | None) -> dict:
+    if not fileName or not os.path.exists(fileName):
+        return {}
+    with open(fileName) as f:
+        return json.load(f)
+
+def saveState(fileName: str | None, states: dict) -> None:
+    if not fileName:
+        return
+    with open(fileName + ".tmp", "w") as f:
+        json.dump(states, f)
+    os.replace(fileName + ".tmp", fileName)
+
+def updateState(gwId: str, states: dict, latest, status: str, detail: str, now: float) -> str | None:
+    """
+    Applies one lookup result and its status (from evaluateStatuses) to the cached state of
+    `gwId` and returns an event line if its status flipped (or, for a gateway seen for the
+    first time, if it isn't online). Failed lookups keep the previous status.
+    """
+    state = states.get(gwId)
+    if status == "Error":
+        if state is None:
+            state = states[gwId] = {"ts": None, "status": "Unknown", "offlineChecks": 0}
+        state["errors"] = state.get("errors", 0) + 1
+        return None
+
+    previous = state["status"] if state else "Unknown"
+    states[gwId] = state = {"ts": latest, "status": status, "errors": 0,
+                            "offlineChecks": state["offlineChecks"] + 1 if state and status == "Offline" == previous else 0}
+    if status == previous or (previous == "Unknown" and status == "Online"):
+        return None
+    nowText = datetime.fromtimestamp(now, timezone.utc).isoformat(timespec="seconds")
+    return f"{nowText} {gwId} {previous} -> {status} ({detail})"
+
+async def runDaemon(gwIds: list[str], args: argparse.Namespace) -> None:
+    """Polls the gateways that are due, forever, printing status flips as they happen."""
+    offlineAfter = timedelta(minutes=args.offline_after)
+    states = loadState(args.state_file)
+    # Gateways not in the cache are due right away; cached ones keep their schedule across restarts.
+    nextCheck = {gwId: states.get(gwId, {}).get("nextCheck", 0.0) for gwId in gwIds}
+    lookups = 0
+    firstRound = True
+    print(f"Monitoring {len(gwIds)} gateways ({len(set(gwIds) & states.keys())} with cached state).", flush=True)
+
+    async with makeClient(args.concurrency, args.timeout) as client:
+        try:
+            while True:
+                now = time.time()
+                due = [gwId for gwId in gwIds if nextCheck[gwId] <= now]
+                if due:
+                    start = time.perf_counter()
+                    results = await fetchLatest(due, args.endpoint, args.concurrency, args.batch_size, args.timeout,
+                                                args.retries, client=client)
+                    lookups += len(due)
+                    now = time.time()
+                    statuses, latest, age = evaluateStatuses(due, results, datetime.fromtimestamp(now, timezone.utc), offlineAfter)
+                    errors = int(np.count_nonzero(statuses == "Error"))
+                    for gwId, status, latestTimestamp, difference in zip(due, statuses.tolist(), latest, age):
+                        detail = f"latest {formatLatest(latestTimestamp)}, age {formatAge(difference)}"
+                        event = updateState(gwId, states, results.get(gwId), status, detail, now)
+                        if event:
+                            print(event, flush=True)
+                        nextCheck[gwId] = states[gwId]["nextCheck"] = now + nextCheckDelay(
+                            states[gwId], now, offlineAfter, args.interval, args.max_interval)
+                    saveState(args.state_file, states)
+                    if firstRound:
+                        firstRound = False
+                        counts = Counter(states[gwId]["status"] for gwId in gwIds)
+                        print(", ".join(f"{count} {status.lower()}" for status, count in sorted(counts.items())), flush=True)
+                    if args.verbose or errors:
+                        print(f"Checked {len(due)} gateways in {time.perf_counter() - start:.2f} s ({errors} failed lookups, "
+                              f"{lookups} lookups so far)", flush=True)
+                await asyncio.sleep(max(1.0, min(nextCheck.values()) - time.time()))
+        finally:
+            saveState(args.state_file, states)
+
+def readGatewayIds(gwIds: list[str], fileName: str | None) -> list[str]:
+    """Gateway IDs from the command line and/or a file (one per line, '#' comments), without duplicates."""
+    if fileName:
+        with open(fileName) as f:
+            gwIds = gwIds + [line.split("#", 1)[0].strip() for line in f]
+    return list(dict.fromkeys(gwId for gwId in gwIds if gwId))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report which Srcful gateways are online.")
+    parser.add_argument("gwIds", nargs="*", help=f"Gateway IDs (default: {DEFAULT_GATEWAY} if no --file is given either).")
+    parser.add_argument("--file", help="File with one gateway ID per line.")
+    parser.add_argument("--endpoint", default=DEFAULT_ENDPOINT, help=f"GraphQL endpoint (default: {DEFAULT_ENDPOINT}).")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once (default: 16).")
+    parser.add_argument("--batch-size", type=int, default=50,
+                        help="Gateways per aliased GraphQL query; 1 sends one query per gateway (default: 50).")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds (default: 10).")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per request on timeouts and 429/5xx (default: 3).")
+    parser.add_argument("--offline-after", type=float, default=5.0,
+                        help="Minutes without data after which a gateway counts as offline (default: 5).")
+    daemon = parser.add_argument_group("daemon mode")
+    daemon.add_argument("--daemon", action="store_true", help="Keep polling and print only status changes.")
+    daemon.add_argument("--interval", type=float, default=30.0,
+                        help="Shortest time between checks of one gateway, in seconds (default: 30).")
+    daemon.add_argument("--max-interval", type=float, default=900.0,
+                        help="Longest time between checks of one gateway, in seconds (default: 900).")
+    daemon.add_argument("--state-file", help="JSON file the per-gateway cache is kept in across restarts.")
+    daemon.add_argument("--verbose", action="store_true", help="Print a line for every polling round.")
+    args = parser.parse_args()
+
+    gwIds = readGatewayIds(args.gwIds, args.file) or [DEFAULT_GATEWAY]
+    if args.concurrency < 1 or args.batch_size < 1:
+        parser.error("--concurrency and --batch-size must be at least 1")
+    if args.daemon:
+        if not 0 < args.interval <= args.max_interval:
+            parser.error("need 0 < --interval <= --max-interval")
+        try:
+            asyncio.run(runDaemon(gwIds, args))
+        except KeyboardInterrupt:
+            print("Stopped.")
+        raise SystemExit(0)
+
+    start = time.perf_counter()
+    results = asyncio.run(fetchLatest(gwIds, args.endpoint, args.concurrency, args.batch_size, args.timeout, args.retries))
+    elapsed = time.perf_counter() - start
+    counts = printTable(gwIds, results, timedelta(minutes=args.offline_after))
+    print(f"{len(gwIds)} gateways in {elapsed:.2f} s: " + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
@@ -0,0 +1,116 @@
+"""
+gateway-monitor.py against the stand-in API (srcful/fake-srcful-api.py), served on an
+ephemeral localhost port for each test.
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import io
+import pathlib
+import threading
+import zlib
+from datetime import datetime, timezone, timedelta
+from http.server import ThreadingHTTPServer
+
+import httpx
+
+SRCFUL_DIR = pathlib.Path(__file__).resolve().parent.parent / "srcful"
+
+def loadScript(fileName: str, moduleName: str):
+    # The scripts have dashes in their names, so they can't be imported normally.
+    spec = importlib.util.spec_from_file_location(moduleName, SRCFUL_DIR / fileName)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+monitor = loadScript("gateway-monitor.py", "gateway_monitor")
+fakeApi = loadScript("fake-srcful-api.py", "fake_srcful_api")
+
+OFFLINE_AFTER = timedelta(minutes=5)
+
+@contextlib.contextmanager
+def serveFakeApi(failFirst: int = 0, **options):
+    """
+    Runs FakeApiHandler on 127.0.0.1:<free port> in a thread and yields (endpoint, queries):
+    the GraphQL queries received, in order. The first `failFirst` requests get a 503.
+    """
+    queries: list[str] = []
+
+    class Handler(fakeApi.FakeApiHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            queries.append(monitor.decodeJson(body)["query"])
+            if len(queries) <= failFirst:
+                self.reply(503, {"message": "Service Unavailable"})
+                return
+            self.rfile = io.BytesIO(body) # let the stand-in read the body again
+            super().do_POST()
+
+    Handler.options = argparse.Namespace(**{"latency": 0.0, "fail_rate": 0.0, "max_aliases": 0, "verbose": False, **options})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", queries
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def expectedStatus(gwId: str) -> str:
+    # Mirrors latestTimestamp in the stand-in: IDs starting with "missing" have no data and
+    # about one in ten is an hour old.
+    if gwId.startswith("missing"):
+        return "No data"
+    return "Offline" if zlib.crc32(gwId.encode()) % 10 == 0 else "Online"
+
+def fetch(gwIds: list[str], endpoint: str, **options) -> dict:
+    return asyncio.run(monitor.fetchLatest(gwIds, endpoint, backoff=0.01, **options))
+
+def statusesOf(gwIds: list[str], results: dict) -> list[str]:
+    statuses, _, _ = monitor.evaluateStatuses(gwIds, results, datetime.now(timezone.utc), OFFLINE_AFTER)
+    return statuses.tolist()
+
+def testBatchedAliases():
+    gwIds = [f"{i:018x}" for i in range(118)] + ["missing-1", 'bad"id\\']
+    with serveFakeApi() as (endpoint, queries):
+        results = fetch(gwIds, endpoint, batchSize=50)
+
+    assert sorted(len(fakeApi.LOOKUP.findall(query)) for query in queries) == [20, 50, 50]
+    assert set(results) == set(gwIds)
+    assert results["missing-1"] is None
+    assert all(isinstance(results[gwId], str) for gwId in gwIds if gwId != "missing-1")
+    assert statusesOf(gwIds, results) == [expectedStatus(gwId) for gwId in gwIds]
+    assert "Offline" in statusesOf(gwIds, results) # the IDs cover every status
+
+def testRetryAfter503():
+    gwIds = ["01239e884755621dee", "missing-2"]
+    with serveFakeApi(failFirst=1) as (endpoint, queries):
+        results = fetch(gwIds, endpoint, retries=2)
+    assert len(queries) == 2
+    assert statusesOf(gwIds, results) == [expectedStatus(gwId) for gwId in gwIds]
+
+    with serveFakeApi(failFirst=1) as (endpoint, queries):
+        results = fetch(gwIds, endpoint, retries=0)
+    assert len(queries) == 1
+    assert all(isinstance(results[gwId], httpx.HTTPStatusError) for gwId in gwIds)
+    assert statusesOf(gwIds, results) == ["Error", "Error"]
+
+def testMaxAliasesFallsBackToSingleLookups():
+    gwIds = [f"{i:018x}" for i in range(24)] + ["missing-3"]
+    with serveFakeApi(max_aliases=10) as (endpoint, queries):
+        results = fetch(gwIds, endpoint, batchSize=25)
+
+    # The batch of 25 is rejected, then every gateway is looked up on its own.
+    assert len(queries) == 1 + len(gwIds)
+    assert len(fakeApi.LOOKUP.findall(queries[0])) == 25
+    assert all(len(fakeApi.LOOKUP.findall(query)) == 1 for query in queries[1:])
+    assert statusesOf(gwIds, results) == [expectedStatus(gwId) for gwId in gwIds]
+
+def testIdsAreEscaped():
+    gwIds = ['x") { latest { ts } } evil: solar(gwId: "y', "ok"]
+    lookups = fakeApi.LOOKUP.findall(monitor.buildQuery(gwIds))
+    assert [alias for alias, _ in lookups] == ["g0", "g1"]
+    with serveFakeApi() as (endpoint, _):
+        results = fetch(gwIds, endpoint)
+    assert statusesOf(gwIds, results) == [expectedStatus(gwId) for gwId in gwIds]
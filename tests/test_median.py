@@ -0,0 +1,122 @@
+"""The median helpers in medianTwoSortedArrays.py against findMedianSortedArrays (merge and sort)."""
+import pathlib
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from medianTwoSortedArrays import (RunningMedian, findMedianSortedArrays, findMedianSortedArraysFast,
+                                   findMedianSortedArraysKWay, findMediansBatch, kthSmallestSortedArrays,
+                                   slidingMedians)
+
+# Small blocks, so splits and emptied blocks happen constantly; the default takes hundreds of values to split once.
+SMALL_BLOCK = 4
+
+def sortedArrays(rng: random.Random, ways: int, maxLength: int = 40) -> list[list[int]]:
+    # Empty sides, ragged lengths, plenty of duplicates and negative values.
+    return [sorted(rng.randint(-20, 20) for _ in range(rng.choice([0, 1, 2, rng.randint(0, maxLength)])))
+            for _ in range(ways)]
+
+def windowMedian(values: list) -> float:
+    half = len(values) // 2
+    return findMedianSortedArrays(values[:half], values[half:])
+
+@pytest.mark.parametrize("seed", range(200))
+def testFastMatchesFindMedianSortedArrays(seed: int):
+    rng = random.Random(seed)
+    nums1, nums2 = sortedArrays(rng, 2)
+    if not nums1 and not nums2:
+        with pytest.raises(ValueError):
+            findMedianSortedArraysFast(nums1, nums2)
+        return
+    assert findMedianSortedArraysFast(nums1, nums2) == findMedianSortedArrays(nums1, nums2)
+    assert findMedianSortedArraysFast(nums2, nums1) == findMedianSortedArrays(nums1, nums2)
+
+@pytest.mark.parametrize("seed", range(20))
+def testBatchMatchesFindMedianSortedArrays(seed: int):
+    rng = random.Random(seed)
+    pairs = [sortedArrays(rng, 2) for _ in range(100)]
+    width1, width2 = max(len(nums1) for nums1, _ in pairs), max(len(nums2) for _, nums2 in pairs)
+    # Rows are padded past their lengths with junk that isn't sorted against the real values.
+    padded1 = np.array([nums1 + [rng.randint(-99, 99) for _ in range(width1 - len(nums1))] for nums1, _ in pairs])
+    padded2 = np.array([nums2 + [rng.randint(-99, 99) for _ in range(width2 - len(nums2))] for _, nums2 in pairs])
+    lengths1 = [len(nums1) for nums1, _ in pairs]
+    lengths2 = [len(nums2) for _, nums2 in pairs]
+    medians = findMediansBatch(padded1, padded2, lengths1, lengths2)
+    for median, (nums1, nums2) in zip(medians, pairs):
+        if nums1 or nums2:
+            assert median == findMedianSortedArrays(nums1, nums2)
+        else:
+            assert np.isnan(median)
+
+def testBatchWithoutLengths():
+    rng = random.Random(0)
+    nums1 = np.sort(np.array([[rng.randint(-20, 20) for _ in range(7)] for _ in range(50)]), axis=1)
+    nums2 = np.sort(np.array([[rng.randint(-20, 20) for _ in range(4)] for _ in range(50)]), axis=1)
+    medians = findMediansBatch(nums1, nums2)
+    assert medians.tolist() == [findMedianSortedArrays(row1.tolist(), row2.tolist()) for row1, row2 in zip(nums1, nums2)]
+    assert findMediansBatch(np.zeros((3, 0)), nums2[:3]).tolist() == [findMedianSortedArrays([], row.tolist()) for row in nums2[:3]]
+    with pytest.raises(ValueError):
+        findMediansBatch(nums1, nums2[:10])
+
+@pytest.mark.parametrize("seed", range(100))
+def testKWayMatchesFindMedianSortedArrays(seed: int):
+    rng = random.Random(seed)
+    arrays = sortedArrays(rng, rng.randint(1, 8))
+    merged = sorted(value for array in arrays for value in array)
+    assert [kthSmallestSortedArrays(arrays, k) for k in range(len(merged))] == merged
+    with pytest.raises(IndexError):
+        kthSmallestSortedArrays(arrays, len(merged))
+    if not merged:
+        with pytest.raises(ValueError):
+            findMedianSortedArraysKWay(arrays)
+        return
+    assert findMedianSortedArraysKWay(arrays) == findMedianSortedArrays(merged, [])
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("blockSize", [1, SMALL_BLOCK, RunningMedian.BLOCK_SIZE])
+def testRunningMedianMatchesFindMedianSortedArrays(seed: int, blockSize: int):
+    rng = random.Random(seed)
+    window = rng.randint(1, 60)
+    values = [rng.randint(-50, 50) for _ in range(rng.randint(1, 300))]
+    running = RunningMedian(window=window, blockSize=blockSize)
+    for end, value in enumerate(values, start=1):
+        running.insert(value)
+        current = values[max(0, end - window):end]
+        assert len(running) == len(current)
+        assert running.median() == windowMedian(current)
+        q = rng.uniform(0, 100)
+        assert np.isclose(running.percentile(q), np.percentile(current, q))
+
+@pytest.mark.parametrize("seed", range(20))
+def testSlidingMedians(seed: int):
+    rng = random.Random(seed)
+    window = rng.randint(1, 60)
+    values = [rng.randint(-50, 50) for _ in range(rng.randint(1, 300))]
+    expected = [findMedianSortedArrays(values[i:i + window], []) for i in range(len(values) - window + 1)]
+    assert list(slidingMedians(values, window, blockSize=SMALL_BLOCK)) == expected
+    assert list(slidingMedians(values, window)) == expected
+
+def testBlockSizeIsPerInstance():
+    small = RunningMedian(range(100), blockSize=SMALL_BLOCK)
+    default = RunningMedian(range(100))
+    assert len(small.blocks) > 1
+    assert len(default.blocks) == 1
+    assert RunningMedian.BLOCK_SIZE == default.blockSize == 512
+
+def testKthAndErrors():
+    running = RunningMedian([5, 1, 4, 2, 3], blockSize=SMALL_BLOCK)
+    assert [running.kth(k) for k in range(5)] == [1, 2, 3, 4, 5]
+    assert running.kth(-1) == 5
+    assert running.evictOldest() == 5
+    assert running.median() == 2.5
+    with pytest.raises(IndexError):
+        running.kth(4)
+    with pytest.raises(ValueError):
+        RunningMedian().median()
+    with pytest.raises(ValueError):
+        RunningMedian(window=0)
+    with pytest.raises(ValueError):
+        RunningMedian(blockSize=0)